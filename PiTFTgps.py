@@ -1,7 +1,16 @@
 #!/usr/bin/python
 
 # PiTFT display engine for GPS
-# This must run as root (sudo python lapse.py) due to framebuffer, etc.
+# This must run as root (sudo python PiTFTgps.py) due to framebuffer, etc.
+# unless run headless:
+#
+#   python PiTFTgps.py                                  # PiTFT, /dev/ttyAMA0
+#   python PiTFTgps.py --headless --replay fixtures/sample.nmea --frames out/
+#   python PiTFTgps.py --headless --replay log.nmea --format raw --frames out.raw
+#   python PiTFTgps.py --track /home/pi/track.bin       # also record every fix
+#
+# headless runs draw into an offscreen surface with no GPIO or framebuffer;
+# replaying a log at --rate 0 renders one frame per epoch as fast as it can
 #
 # http://www.adafruit.com/products/998  (Raspberry Pi Model B)
 # http://www.adafruit.com/products/1601 (PiTFT Mini Kit)
@@ -11,80 +20,23 @@
 #
 # (c) Copyright 2014 William B. Phelps
 
-import wiringpi2 as wiringpi
-import errno
-import os, sys, signal
-import traceback
+import os, sys, signal, time
+import argparse
 
-import pygame
-from pygame.locals import *
-
-from time import sleep
-from datetime import datetime, timedelta
+from datetime import datetime
 import ephem #, ephem.stars
 import math
 import logging
-#import threading
-
-from pyGPS import pyGPS, satInfo
-
-# -------------------------------------------------------------
-
-switch_1 = 1 # GPIO pin 18 - left to right with switches on the top
-switch_2 = 2 # GPIO pin 21/27
-switch_3 = 3 # GPIO pin 22
-switch_4 = 4 # GPIO pin 23
-
-backlightpin = 252
 
-# set up initial observer location
-obs = ephem.Observer()
-obs.lat = math.radians(37.4388)
-obs.lon = math.radians(-122.124)
+from gpsMetrics import metrics
+from gpsDisplay import tftDisplay, headlessDisplay
+from gpsButtons import sysfsButtons, noButtons
+from gpsPower import powerGovernor
 
-tNow = datetime.utcnow()
-obs.date = tNow
-
-Red = pygame.Color('red')
-Orange = pygame.Color('orange')
-Green = pygame.Color('green')
-Blue = pygame.Color('blue')
-Yellow = pygame.Color('yellow')
-Cyan = pygame.Color('cyan')
-Magenta = pygame.Color('magenta')
-White = pygame.Color('white')
-Black = (0,0,0)
-R90 = math.radians(90) # 90 degrees in radians
+LOGFILE = '/home/pi/isstracker/isstracker.log'
 
 # ---------------------------------------------------------------
 
-def StopAll():
-    print 'StopAll'
-    global gps_on
-    if gps_on:
-      gps.stop()
-    sleep(1)
-    pygame.quit()
-
-def Exit():
-    print 'Exit'
-    StopAll()
-    sys.exit(0)
-
-def signal_handler(signal, frame):
-    print 'SIGNAL {}'.format(signal)
-    Exit()
-
-def backlight(set):
-    os.system("echo 252 > /sys/class/gpio/export")
-    os.system("echo 'out' > /sys/class/gpio/gpio252/direction")
-    if (set):
-#        gpio.digitalWrite(backlightpin,gpio.LOW)
-        os.system("echo '1' > /sys/class/gpio/gpio252/value")
-    else:
-#        gpio.digitalWrite(backlightpin,gpio.HIGH)
-        os.system("echo '0' > /sys/class/gpio/gpio252/value")
-
 def Shutdown():
     command = "/usr/bin/sudo /sbin/shutdown -f now"
     import subprocess
@@ -92,123 +44,192 @@ def Shutdown():
     output = process.communicate()[0]
     print output
 
-# ---------------------------------------------------------------------
-
-def checkButtons():
-
-    sw1 = not wiringpi.digitalRead(switch_1) # Read switch
-    if sw1: print 'switch 1'
-    sw2 = not wiringpi.digitalRead(switch_2) # Read switch
-    if sw2: print 'switch 2'
-    sw3 = not wiringpi.digitalRead(switch_3) # Read switch
-    if sw3: print 'switch 3'
-    sw4 = not wiringpi.digitalRead(switch_4) # Read switch
-    if sw4: print 'switch 4'
-
-    return False
-
-# ---------------------------------------------------------------------
-
-# Init framebuffer/touchscreen environment variables
-os.putenv('SDL_VIDEODRIVER', 'fbcon')
-os.putenv('SDL_FBDEV'      , '/dev/fb1')
-os.putenv('SDL_MOUSEDRV'   , 'TSLIB')
-os.putenv('SDL_MOUSEDEV'   , '/dev/input/touchscreen')
-
-# Set up GPIO pins
-wiringpi.wiringPiSetup() # use wiringpi pin numbers
-
-wiringpi.pinMode(switch_1,0) # input
-wiringpi.pullUpDnControl(switch_1, 2)
-wiringpi.pinMode(switch_2,0) # input
-wiringpi.pullUpDnControl(switch_2, 2)
-wiringpi.pinMode(switch_3,0) # input
-wiringpi.pullUpDnControl(switch_3, 2)
-wiringpi.pinMode(switch_4,0) # input
-wiringpi.pullUpDnControl(switch_4, 2)
-
-# Init pygame and screen
-pygame.init() 
-
-pygame.mouse.set_visible(False)
-size = pygame.display.list_modes(16)[0] # get screen size
-#print "size: {}".format(size)
-
-#screen = pygame.display.set_mode(size, FULLSCREEN, 16)
-screen = pygame.display.set_mode(size)
-(width, height) = size
-
-backlight(True)
-
-# start the GPS thread running
-gps = pyGPS()
-gps.start()
-gps_on = True
-
-#bg = pygame.image.load("ISSTracker7.png")
-bg = pygame.Surface((320,240))
-bg.fill((0,0,0))
-bgRect = bg.get_rect()
-txtColor = Yellow
-txtFont = pygame.font.SysFont("Arial", 30, bold=True)
-txt = txtFont.render('PiTFT GPS' , 1, txtColor)
-bg.blit(txt, (15, 28))
-txt = txtFont.render('by' , 1, txtColor)
-bg.blit(txt, (15, 64))
-txt = txtFont.render('William Phelps' , 1, txtColor)
-bg.blit(txt, (15, 100))
-screen.blit(bg, bgRect)
-pygame.display.update()
-sleep(3)
-
-#  ----------------------------------------------------------------
-
-logging.basicConfig(filename='/home/pi/isstracker/isstracker.log',filemode='w',level=logging.DEBUG)
-logging.info("ISS-Tracker System Startup")
-
-signal.signal(signal.SIGTERM, signal_handler)
-signal.signal(signal.SIGINT, signal_handler)
-signal.signal(signal.SIGHUP, signal_handler)
-signal.signal(signal.SIGQUIT, signal_handler)
-#print "sigterm handler set"
-
-
-while(True):
-
-  try:
-    from showGPS import showGPS
-
-    utcNow = datetime.utcnow()
-    obs.date = utcNow
-    sun = ephem.Sun(obs)
-
-    sGPS = showGPS(screen, gps, obs, sun) # set up the GPS display screen
-
-    # show the sky with GPS positions & signal
+def signal_handler(signal, frame):
+    print 'SIGNAL {}'.format(signal)
+    sys.exit(0) # cleaned up by main()
+
+def splash(display):
+    # shown while the star catalog and ephemeris load
+    import pygame
+    from fontCache import getFont, render
+    screen = display.screen
+    screen.fill((0,0,0))
+    txtColor = pygame.Color('yellow')
+    txtFont = getFont("Arial", 30, bold=True)
+    screen.blit(render(txtFont, 'PiTFT GPS', txtColor), (15, 28))
+    screen.blit(render(txtFont, 'by', txtColor), (15, 64))
+    screen.blit(render(txtFont, 'William Phelps', txtColor), (15, 100))
+    display.update()
+
+def openGPS(args):
+    # the receiver, or a recorded log standing in for it
+    from pyGPS import pyGPS
+    if args.replay:
+      from gpsSource import replaySource
+      port = replaySource(args.replay, rate=args.rate, loop=args.loop)
+      return pyGPS(port=port), port
+    gps = pyGPS(args.device, args.baud)
+    if args.mtk:
+      gps.configure(args.baud, args.fix_rate)
+    return gps, None
+
+def step(gps, port):
+  # feed a replayed log until the next epoch is complete, False at the end
+  epoch = gps.epoch
+  while gps.epoch == epoch:
+    line = port.readline()
+    if not line: return False
+    gps.feed(line)
+  return True
+
+def run(display, buttons, gps, port=None, count=None, power=None):
+  from showGPS import showGPS
+  from plotSky import ephemeris
+
+  # set up initial observer location
+  obs = ephem.Observer()
+  obs.lat = math.radians(37.4388)
+  obs.lon = math.radians(-122.124)
+
+  sync = port is not None and not port.rate # unthrottled replay, a frame per epoch
+  fixes = gps.fixes(maxlen=1) # only the latest matters
+  pressed = gps.hub.subscribe('button')
+  buttons.start(gps.hub)
+  if sync:
+    step(gps, port)
+  else:
+    gps.start()
+
+  fix = gps.fix
+  obs.date = datetime.utcnow()
+  sun = ephemeris.position('Sun', obs)
+  sGPS = showGPS(display.screen, gps, obs, sun, display=display) # set up the GPS display screen
+  if power is None: power = powerGovernor(display)
+
+  # show the sky with GPS positions & signal
+  # the governor picks when to redraw: every epoch while moving or in use,
+  # less often when stationary, not at all with the backlight off
+  frames = 0
+  while count is None or frames < count:
+
+    if fix.quality > 0:
+      obs.lat = fix.avg_latitude
+      obs.lon = fix.avg_longitude
+    elif fix.status == 'A':
+      obs.lat = fix.latitude
+      obs.lon = fix.longitude
+
+    if port is not None and fix.utc is not None:
+      obs.date = datetime.utcfromtimestamp(fix.utc) # sky as it was when recorded
+    else:
+      obs.date = datetime.utcnow() # update observer time
+    sun = ephemeris.position('Sun', obs) # cached, recomputed as it moves
+    sGPS.plot(gps, obs, sun)
+    display.frame()
+    frames += 1
+
+    if sync:
+      if not step(gps, port): break
+      fix = gps.fix
+      continue
+
+    # sleep until the governor wants a frame, taking fixes and buttons as they come
+    power.frame()
+    fresh = False
     while True:
-
-      obs.date = utcNow # update observer time
-      sun = ephem.Sun(obs) # recompute sun
-      sGPS.plot(gps, obs, sun)
-      sec = utcNow.second
-      while sec == utcNow.second: # wait for clock to tic
-        if checkButtons(): break
-        sleep(0.1)
-        utcNow = datetime.utcnow()
-
-      if gps.quality > 0:
-        obs.lat = gps.avg_latitude
-        obs.lon = gps.avg_longitude
-      elif gps.status == 'A':
-        obs.lat = gps.latitude
-        obs.lon = gps.longitude
-
-  except SystemExit:
-    print 'SystemExit'
-    sys.exit(0)
-  except:
-    print '"Except:', sys.exc_info()[0]
-    page = None
-#    print traceback.format_exc()
-    StopAll()
-    raise
+      draw, timeout = power.next(fresh)
+      if draw: break
+      ready = gps.hub.wait([fixes, pressed], timeout)
+      if pressed in ready:
+        while len(pressed):
+          power.input()
+          button(pressed.get(0))
+        fresh = True
+      if fixes in ready:
+        fix = fixes.get(0)
+        power.fix(fix)
+        fresh = True
+      if port is not None and port.eof: return frames
+  return frames
+
+def button(event):
+  switch, kind, held = event
+  print 'switch {} {}'.format(switch, kind)
+
+def main(argv=None):
+  ap = argparse.ArgumentParser(description='GPS sky display for the PiTFT')
+  ap.add_argument('--device', default='/dev/ttyAMA0', help='GPS serial port')
+  ap.add_argument('--baud', type=int, default=9600)
+  ap.add_argument('--mtk', action='store_true', help='configure an MTK receiver: find its speed, '
+    'switch it to --baud and send only the sentences used')
+  ap.add_argument('--fix-rate', type=int, help='with --mtk, fixes per second (1-10)')
+  ap.add_argument('--replay', metavar='LOG', help='play a recorded NMEA log instead of the receiver')
+  ap.add_argument('--rate', type=float, help='replay speed, 1 = real time, 0 = unthrottled '
+    '(default 1, 0 when headless)')
+  ap.add_argument('--loop', action='store_true', help='replay the log over and over')
+  ap.add_argument('--headless', action='store_true', help='draw offscreen, no PiTFT or GPIO')
+  ap.add_argument('--frames', metavar='PATH', help='headless: save frames, PNGs in this '
+    'directory or raw RGB to this file')
+  ap.add_argument('--format', choices=('png', 'raw'), default='png')
+  ap.add_argument('--count', type=int, help='stop after this many frames')
+  ap.add_argument('--dim', type=float, default=60, metavar='SECONDS', help='dim the backlight after '
+    'this long stationary with no buttons (default 60, 0 = never)')
+  ap.add_argument('--off', type=float, default=300, metavar='SECONDS', help='backlight off and '
+    'no redraws after this long, until a button (default 300, 0 = never)')
+  ap.add_argument('--track', metavar='FILE', help='record every fix to this binary track log, '
+    'see trackLog.py')
+  ap.add_argument('--log', help='log file (default {}, none when headless)'.format(LOGFILE))
+  args = ap.parse_args(argv)
+  if args.rate is None:
+    args.rate = 0 if args.headless else 1.0
+
+  log = args.log if args.log is not None else (None if args.headless else LOGFILE)
+  if log and os.path.isdir(os.path.dirname(log) or '.'):
+    logging.basicConfig(filename=log, filemode='w', level=logging.DEBUG)
+  logging.info("PiTFT GPS startup")
+
+  # counters & timings, e.g. GPS_STATS=/tmp/gps-stats.json or GPS_STATS_SOCKET=/tmp/gps-stats.sock
+  if os.environ.get('GPS_STATS') or os.environ.get('GPS_STATS_SOCKET'):
+    metrics.enable(statsFile=os.environ.get('GPS_STATS'), socket=os.environ.get('GPS_STATS_SOCKET'))
+
+  if args.headless:
+    display = headlessDisplay(frames=args.frames, format=args.format)
+    buttons = noButtons()
+  else:
+    display = tftDisplay()
+    buttons = sysfsButtons()
+  display.open()
+  if not args.headless:
+    splash(display)
+
+  signal.signal(signal.SIGTERM, signal_handler)
+  signal.signal(signal.SIGINT, signal_handler)
+  signal.signal(signal.SIGHUP, signal_handler)
+  signal.signal(signal.SIGQUIT, signal_handler)
+
+  gps, port = openGPS(args)
+  logger = None
+  if args.track:
+    from trackLog import trackLog, trackLogger
+    logger = trackLogger(gps, trackLog(args.track))
+    logger.start()
+  t = time.time()
+  frames = 0
+  try:
+    power = powerGovernor(display, dimAfter=args.dim or None, offAfter=args.off or None)
+    frames = run(display, buttons, gps, port, args.count, power)
+  finally:
+    print 'StopAll'
+    gps.stop()
+    if logger is not None:
+      logger.stop()
+      logger.thread.join(2.0)
+      logger.log.close()
+    buttons.close()
+    display.close()
+    if args.headless:
+      t = time.time() - t
+      print '{} frames in {:.2f}s, {:.1f} fps'.format(frames, t, frames / t if t else 0)
+
+if __name__ == '__main__':
+  main()
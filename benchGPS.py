@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+# benchmarks for the parse -> state -> render pipeline
+# runs against the NMEA logs in fixtures/ and writes machine readable
+# results so releases can be compared:
+#
+#   python benchGPS.py                      # all stages, summary to stdout
+#   python benchGPS.py -o results.json      # also save as JSON
+#   python benchGPS.py -s parse -s frame    # selected stages only
+#
+# stages that need pygame or ephem are skipped, with the reason recorded,
+# when those are not installed
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, sys, time, json, platform, subprocess
+import argparse
+from datetime import datetime
+
+here = os.path.dirname(os.path.abspath(__file__))
+fixture = os.path.join(here, 'fixtures', 'sample.nmea')
+
+class nullPort():
+  # a port that never has data, so pyGPS can be fed directly
+  def inWaiting(self): return 0
+  def read(self, size=1): return ''
+  def close(self): pass
+
+def stats(samples, unit, **extra):
+  # summary of a list of measurements
+  s = sorted(samples)
+  n = len(s)
+  r = {'n': n, 'unit': unit, 'min': s[0], 'max': s[-1],
+    'mean': sum(s)/n, 'median': s[n//2], 'p95': s[min(n-1, int(n*0.95))]}
+  r.update(extra)
+  return r
+
+def loadLog(kinds=None):
+  # fixture sentences, optionally only some sentence types
+  lines = open(fixture, 'rb').read().splitlines(True)
+  if kinds:
+    lines = [l for l in lines if l[3:6] in kinds]
+  return lines
+
+def newGPS():
+  from pyGPS import pyGPS
+  return pyGPS(port=nullPort())
+
+def benchParse(repeat, passes=20):
+  # sentences per second through pyGPS.feed, fed in 4 kB chunks
+  res = {}
+  for name, kinds in (('gga', ('GGA',)), ('gsv', ('GSV',)), ('rmc', ('RMC',)), ('mixed', None)):
+    lines = loadLog(kinds)
+    data = ''.join(lines)
+    chunks = [data[i:i+4096] for i in range(0, len(data), 4096)]
+    rates = []
+    for r in range(repeat):
+      gps = newGPS()
+      t = time.time()
+      for p in range(passes):
+        for c in chunks:
+          gps.feed(c)
+      rates.append(passes * len(lines) / (time.time() - t))
+    res['parse.' + name] = stats(rates, 'sentences/s', sentences=len(lines))
+  return res
+
+def setupDisplay():
+  os.environ['SDL_VIDEODRIVER'] = 'dummy' # offscreen
+  import pygame, ephem
+  pygame.init()
+  screen = pygame.display.set_mode((320,240), 0, 16) # PiTFT is 16 bit
+  obs = ephem.Observer()
+  obs.lat = '37.4388'
+  obs.lon = '-122.124'
+  obs.date = datetime(2014, 6, 1, 5, 0, 0) # night, planets up
+  return pygame, ephem, screen, obs
+
+def benchBackground(repeat):
+  # time to draw stars and planets into a background surface
+  pygame, ephem, screen, obs = setupDisplay()
+  from plotSky import plotStars, plotPlanets
+  sun = ephem.Sun(obs)
+  surf = screen.copy()
+  ts, tp = [], []
+  for r in range(repeat):
+    t = time.time()
+    plotStars(surf, obs, sun)
+    t1 = time.time()
+    plotPlanets(surf, obs, sun)
+    ts.append((t1 - t) * 1000)
+    tp.append((time.time() - t1) * 1000)
+  res = {'bg.plotStars': stats(ts, 'ms'), 'bg.plotPlanets': stats(tp, 'ms')}
+  res['bg.catalog9k'] = benchCatalog(repeat, obs, sun, surf)
+  return res
+
+def benchCatalog(repeat, obs, sun, surf, n=9000):
+  # plotStars with a naked eye sized catalog, random positions, star
+  # counts rising with magnitude roughly like the real sky
+  import numpy as np
+  import plotSky
+  from starCatalog import starCatalog
+  rnd = np.random.RandomState(1)
+  ra = rnd.uniform(0, 360, n)
+  dec = np.degrees(np.arcsin(rnd.uniform(-1, 1, n)))
+  mag = np.clip(6.5 + 2 * np.log10(rnd.uniform(0, 1, n)), -1.5, 6.5)
+  saved = plotSky.stars
+  plotSky.stars = starCatalog(ra=ra, dec=dec, mag=mag)
+  t = []
+  try:
+    for r in range(repeat):
+      t0 = time.time()
+      plotSky.plotStars(surf, obs, sun)
+      t.append((time.time() - t0) * 1000)
+  finally:
+    plotSky.stars = saved
+  return stats(t, 'ms', stars=n)
+
+def epochs():
+  # fixture split into one chunk per epoch, each ending at the RMC
+  out, cur = [], []
+  for l in loadLog():
+    cur.append(l)
+    if l[3:6] == 'RMC':
+      out.append(''.join(cur))
+      cur = []
+  return out
+
+def benchFrame(repeat):
+  # showGPS.plot frame time, and sentence arrival to frame complete
+  pygame, ephem, screen, obs = setupDisplay()
+  from showGPS import showGPS
+  sun = ephem.Sun(obs)
+  eps = epochs()
+  gps = newGPS()
+  gps.feed(eps[0])
+  sGPS = showGPS(screen, gps, obs, sun)
+  frame, latency = [], []
+  for r in range(repeat):
+    for e in eps:
+      t = time.time()
+      gps.feed(e)
+      t1 = time.time()
+      sGPS.plot(gps, obs, sun)
+      t2 = time.time()
+      frame.append((t2 - t1) * 1000)
+      latency.append((t2 - t) * 1000)
+  from fontCache import texts
+  return {'frame.plot': stats(frame, 'ms', textCache=texts.stats()),
+    'e2e.latency': stats(latency, 'ms')}
+
+stages = [('parse', benchParse), ('background', benchBackground), ('frame', benchFrame)]
+
+def version():
+  try:
+    return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+      cwd=here, stderr=subprocess.STDOUT).strip()
+  except (OSError, subprocess.CalledProcessError):
+    return 'unknown'
+
+def main():
+  ap = argparse.ArgumentParser(description='PiTFT-GPS benchmarks')
+  ap.add_argument('-s', '--stage', action='append', choices=[s[0] for s in stages],
+    help='stage to run, may be repeated (default all)')
+  ap.add_argument('-n', '--repeat', type=int, default=5, help='repetitions per stage')
+  ap.add_argument('-o', '--output', help='write JSON results to this file')
+  args = ap.parse_args()
+
+  sys.path.insert(0, here)
+  report = {'version': version(), 'time': datetime.utcnow().isoformat(),
+    'python': platform.python_version(), 'machine': platform.machine(),
+    'fixture': os.path.basename(fixture), 'results': {}, 'skipped': {}}
+  for name, fn in stages:
+    if args.stage and name not in args.stage: continue
+    try:
+      report['results'].update(fn(args.repeat))
+    except ImportError as e:
+      report['skipped'][name] = str(e)
+
+  for k in sorted(report['results']):
+    r = report['results'][k]
+    print '{:16} median {:10.2f} p95 {:10.2f} {}'.format(k, r['median'], r['p95'], r['unit'])
+  for k, why in report['skipped'].items():
+    print '{:16} skipped: {}'.format(k, why)
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+  main()
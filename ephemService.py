@@ -0,0 +1,97 @@
+# cached Sun, Moon and planet positions
+# each body is computed with libastro at two times, now and a step ahead,
+# and alt/az in between are interpolated; the step is sized from how fast
+# the body moved across the sky chart last time, so a body is recomputed
+# about once per "tolerance" of movement (a pixel or so) and no more
+# moving the observer more than moveLimit throws the cache away
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math
+import ephem
+
+R90 = math.radians(90) # 90 degrees in radians
+PI2 = 2 * math.pi
+
+class bodyPos(object):
+  # what the display needs of a body, same attribute names as ephem
+  __slots__ = ('name', 'alt', 'az')
+
+  def __init__(self, name, alt, az):
+    self.name = name
+    self.alt = alt
+    self.az = az
+
+class ephemBody():
+
+  def __init__(self, body, tolerance, minStep, maxStep):
+    self.body = body # ephem body object, reused
+    self.name = body.name
+    self.tolerance = tolerance
+    self.minStep = minStep # seconds
+    self.maxStep = maxStep
+    self.step = minStep
+    self.a = None # (date, alt, az) at start and end of the step
+    self.b = None
+
+  def sample(self, obs, date):
+    obs.date = date
+    self.body.compute(obs)
+    return (date, float(self.body.alt), float(self.body.az))
+
+  def resize(self):
+    # step for the next interval from the movement over the last one
+    (t0, alt0, az0), (t1, alt1, az1) = self.a, self.b
+    daz = (az1 - az0 + math.pi) % PI2 - math.pi
+    dist = math.hypot(alt1 - alt0, (R90 - alt1) * daz) # as seen on the chart
+    secs = (t1 - t0) * 86400
+    if dist > 0:
+      self.step = min(max(self.tolerance / (dist / secs), self.minStep), self.maxStep)
+    else:
+      self.step = self.maxStep
+
+  def position(self, obs, date):
+    a, b = self.a, self.b
+    if a is None or date < a[0] or date > b[0]:
+      if b is not None and b[0] <= date < b[0] + self.step * ephem.second:
+        self.a = a = b # carry on from the end of the last step
+      else:
+        self.a = a = self.sample(obs, date)
+      self.b = b = self.sample(obs, a[0] + self.step * ephem.second)
+      self.resize()
+    f = (date - a[0]) / (b[0] - a[0])
+    daz = (b[2] - a[2] + math.pi) % PI2 - math.pi
+    return bodyPos(self.name, a[1] + f * (b[1] - a[1]), (a[2] + f * daz) % PI2)
+
+class ephemService():
+
+  def __init__(self, tolerance=math.radians(0.5), moveLimit=math.radians(0.01)):
+    self.tolerance = tolerance # chart movement allowed between computations
+    self.moveLimit = moveLimit # observer movement that invalidates the cache
+    self.obs = ephem.Observer() # private copy, dates are set per computation
+    self.bodies = {}
+    for body, minStep, maxStep in ((ephem.Sun(), 10, 300), (ephem.Moon(), 5, 120),
+        (ephem.Mercury(), 10, 300), (ephem.Venus(), 10, 300), (ephem.Mars(), 10, 300),
+        (ephem.Jupiter(), 10, 300), (ephem.Saturn(), 10, 300)):
+      self.bodies[body.name] = ephemBody(body, tolerance, minStep, maxStep)
+    self.computes = 0 # libastro computations done, for statistics
+
+  def locate(self, obs):
+    # follow the caller's observer, drop cached positions if it moved
+    me = self.obs
+    if (abs(float(obs.lat) - float(me.lat)) > self.moveLimit or
+        abs(float(obs.lon) - float(me.lon)) > self.moveLimit or
+        obs.elevation != me.elevation):
+      me.lat, me.lon, me.elevation = obs.lat, obs.lon, obs.elevation
+      for b in self.bodies.values():
+        b.a = b.b = None
+
+  def position(self, name, obs):
+    '''alt/az of a body ('Sun', 'Moon', 'Mars', ...) for obs at obs.date'''
+    self.locate(obs)
+    b = self.bodies[name]
+    a = b.a
+    pos = b.position(self.obs, float(obs.date))
+    if b.a is not a: self.computes += 1
+    return pos
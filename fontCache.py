@@ -0,0 +1,57 @@
+# font registry and rendered text cache for the display
+# fonts are looked up once per (name, size, bold), and rendered text
+# surfaces are kept in a bounded LRU keyed by text, font and colours,
+# so labels that repeat every frame are only rasterised once
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import pygame
+from collections import OrderedDict
+
+fonts = {} # (name, size, bold) -> pygame font
+
+def getFont(name, size, bold=False):
+  key = (name, size, bold)
+  font = fonts.get(key)
+  if font is None:
+    font = fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+  return font
+
+class textCache():
+
+  def __init__(self, maxsize=256):
+    self.maxsize = maxsize
+    self.cache = OrderedDict() # least recently used first
+    self.hits = 0
+    self.misses = 0
+
+  def render(self, font, text, color, bg=None):
+    '''font.render(text, 1, color, bg) from the cache if possible
+    the surface is shared, blit it but don't draw on it'''
+    key = (text, font, tuple(color), bg if bg is None else tuple(bg))
+    cache = self.cache
+    surf = cache.pop(key, None)
+    if surf is None:
+      self.misses += 1
+      if bg is None:
+        surf = font.render(text, 1, color)
+      else:
+        surf = font.render(text, 1, color, bg)
+      if len(cache) >= self.maxsize:
+        cache.popitem(last=False) # drop least recently used
+    else:
+      self.hits += 1
+    cache[key] = surf # most recently used
+    return surf
+
+  def stats(self):
+    return {'size': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+  def clear(self):
+    self.cache.clear()
+
+texts = textCache() # shared by the display modules
+
+def render(font, text, color, bg=None):
+  return texts.render(font, text, color, bg)
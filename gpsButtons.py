@@ -0,0 +1,210 @@
+# button input for PiTFTgps
+# buttons publish events on a gpsHub under 'button', so the main loop
+# waits for button presses and GPS epochs with the same gpsHub.wait();
+# an event is a tuple (switch, kind, held):
+#
+#   (2, 'press', 0)        switch 2 went down
+#   (2, 'long', 1.0)       and has been held longPress seconds
+#   (2, 'release', 1.4)    and came up after 1.4 seconds
+#
+#   sysfsButtons  the four PiTFT switches through /sys/class/gpio with
+#                 edge interrupts; a thread sleeps in epoll until an edge,
+#                 a debounce/long press deadline or close(), never on a timer
+#   simButtons    in memory switches driven by press()/release(), for
+#                 tests and headless runs
+#   noButtons     nothing, ever
+#
+# debouncing acts on the first edge, so a press is seen at once, then
+# ignores the pin for debounce seconds and reads it again to settle
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, time, errno, select, threading
+
+class buttonLogic():
+
+  def __init__(self, hub, read, n=4, debounce=0.03, longPress=1.0, clock=time.time):
+    self.hub = hub # events are published here under 'button'
+    self.read = read # read(i) -> True if switch i is down now
+    self.debounce = debounce
+    self.longPress = longPress
+    self.clock = clock
+    self.down = [False] * n # accepted state
+    self.since = [0.0] * n # time of the last accepted change
+    self.settle = [None] * n # end of the bounce lockout
+    self.longAt = [None] * n # when a held switch becomes a long press
+    self.events = 0
+
+  def publish(self, i, kind, held):
+    self.events += 1
+    self.hub.publish('button', (i + 1, kind, held))
+
+  def accept(self, i, down, t):
+    held = t - self.since[i]
+    self.down[i] = down
+    self.since[i] = t
+    if down:
+      self.longAt[i] = t + self.longPress
+      self.publish(i, 'press', 0)
+    else:
+      self.longAt[i] = None
+      self.publish(i, 'release', held)
+
+  def edge(self, i, t=None):
+    '''an edge on switch i, from an interrupt or the simulator'''
+    if t is None: t = self.clock()
+    if self.settle[i] is not None: return # bouncing, look again when it settles
+    self.settle[i] = t + self.debounce
+    down = self.read(i)
+    if down != self.down[i]:
+      self.accept(i, down, t)
+
+  def due(self, t=None):
+    '''handle deadlines that have passed, returns seconds to the next
+    one or None if there is nothing to wait for'''
+    if t is None: t = self.clock()
+    for i in range(len(self.down)):
+      s = self.settle[i]
+      if s is not None and s <= t:
+        self.settle[i] = None
+        down = self.read(i)
+        if down != self.down[i]: # changed while we weren't looking
+          self.accept(i, down, s)
+      l = self.longAt[i]
+      if l is not None and l <= t:
+        self.longAt[i] = None
+        self.publish(i, 'long', t - self.since[i])
+    pending = [d for d in self.settle + self.longAt if d is not None]
+    if not pending: return None
+    return max(min(pending) - t, 0)
+
+class sysfsButtons():
+
+  def __init__(self, gpios=(18, 27, 22, 23), debounce=0.03, longPress=1.0, root='/sys/class/gpio'):
+    self.gpios = gpios # BCM numbers, left to right; 21 not 27 on a rev 1 Pi
+    self.debounce = debounce
+    self.longPress = longPress
+    self.root = root
+    self.fds = []
+    self._run = False
+
+  def write(self, path, value):
+    with open(os.path.join(self.root, path), 'w') as f:
+      f.write(value)
+
+  def open(self):
+    for g in self.gpios:
+      if not os.path.exists(os.path.join(self.root, 'gpio{}'.format(g))):
+        self.write('export', str(g))
+      self.write('gpio{}/direction'.format(g), 'in')
+      self.write('gpio{}/edge'.format(g), 'both')
+      self.fds.append(os.open(os.path.join(self.root, 'gpio{}/value'.format(g)), os.O_RDONLY))
+    self.pullUps()
+
+  def pullUps(self):
+    # sysfs can't set pull ups, the PiTFT switches need them
+    try:
+      import wiringpi2 as wiringpi
+    except ImportError:
+      print 'buttons: no wiringpi2, pull ups not set'
+      return
+    wiringpi.wiringPiSetupGpio() # BCM numbers
+    for g in self.gpios:
+      wiringpi.pullUpDnControl(g, 2)
+
+  def read(self, i):
+    fd = self.fds[i]
+    os.lseek(fd, 0, os.SEEK_SET)
+    return os.read(fd, 2)[:1] == '0' # switches pull the pin low
+
+  def start(self, hub):
+    if not self.fds: self.open()
+    self.logic = buttonLogic(hub, self.read, len(self.gpios), self.debounce, self.longPress)
+    if hasattr(select, 'epoll'):
+      self.poller = select.epoll()
+      flags, wake, scale = select.EPOLLPRI | select.EPOLLERR, select.EPOLLIN, 1
+    else:
+      self.poller = select.poll()
+      flags, wake, scale = select.POLLPRI | select.POLLERR, select.POLLIN, 1000
+    self.scale = scale # poll() wants ms, epoll seconds
+    self.index = {}
+    for i, fd in enumerate(self.fds):
+      self.read(i) # clear the pending interrupt from open
+      self.poller.register(fd, flags)
+      self.index[fd] = i
+    self.wake = os.pipe() # close() writes here to end run()
+    self.poller.register(self.wake[0], wake)
+    self._run = True
+    self.thread = threading.Thread(target = self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def run(self):
+    logic = self.logic
+    wait = None
+    while self._run:
+      try:
+        events = self.poller.poll(-1 if wait is None else wait * self.scale)
+      except (IOError, select.error) as e:
+        if e.args[0] != errno.EINTR: raise
+        events = []
+      if not self._run: break
+      for fd, ev in events:
+        if fd in self.index:
+          logic.edge(self.index[fd])
+      wait = logic.due()
+
+  def close(self):
+    self._run = False
+    if hasattr(self, 'thread'):
+      os.write(self.wake[1], 'x')
+      self.thread.join() # reads the value fds until it has gone
+      if hasattr(self.poller, 'close'): # epoll, not poll
+        self.poller.close()
+      for fd in self.wake:
+        os.close(fd)
+      del self.thread
+    for fd in self.fds:
+      os.close(fd)
+    self.fds = []
+
+class simButtons():
+  # switches in memory; press()/release() act like the pin changing, and
+  # tick() stands in for the deadlines the sysfs thread would sleep until
+
+  def __init__(self, n=4, debounce=0.03, longPress=1.0, clock=time.time):
+    self.n = n
+    self.debounce = debounce
+    self.longPress = longPress
+    self.clock = clock
+    self.pins = [False] * n # down
+    self.logic = None
+
+  def start(self, hub):
+    self.logic = buttonLogic(hub, self.pins.__getitem__, self.n, self.debounce,
+      self.longPress, self.clock)
+
+  def set(self, switch, down, t=None):
+    self.pins[switch - 1] = down
+    self.logic.edge(switch - 1, t)
+
+  def press(self, switch, t=None):
+    self.set(switch, True, t)
+
+  def release(self, switch, t=None):
+    self.set(switch, False, t)
+
+  def tick(self, t=None):
+    return self.logic.due(t)
+
+  def close(self):
+    pass
+
+class noButtons():
+
+  def start(self, hub):
+    pass
+
+  def close(self):
+    pass
@@ -0,0 +1,117 @@
+# display backends for PiTFTgps
+# a backend owns the screen surface and is what showGPS calls update() on;
+# the main loop calls frame() once each frame is complete
+#
+#   tftDisplay        the PiTFT framebuffer through SDL fbcon, nothing is
+#                     touched until open()
+#   headlessDisplay   an offscreen surface, no display needed; frames can
+#                     be kept in memory, saved as PNG files or appended to
+#                     a raw RGB file (ffmpeg -f rawvideo -pix_fmt rgb24
+#                     -s 320x240 -i frames.raw ...)
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os
+
+class tftDisplay():
+
+  def __init__(self, fbdev='/dev/fb1', touch='/dev/input/touchscreen', backlightPin=252):
+    self.fbdev = fbdev
+    self.touch = touch
+    self.backlightPin = backlightPin
+    self.light = None # gpsPower backlight, opened on first use
+    self.screen = None
+    self.size = None
+
+  def open(self):
+    # framebuffer/touchscreen environment, then pygame
+    os.putenv('SDL_VIDEODRIVER', 'fbcon')
+    os.putenv('SDL_FBDEV'      , self.fbdev)
+    os.putenv('SDL_MOUSEDRV'   , 'TSLIB')
+    os.putenv('SDL_MOUSEDEV'   , self.touch)
+    import pygame
+    pygame.init()
+    pygame.mouse.set_visible(False)
+    self.size = pygame.display.list_modes(16)[0] # get screen size
+    self.screen = pygame.display.set_mode(self.size)
+    self.backlight(True)
+    return self.screen
+
+  def update(self, rects=None):
+    import pygame
+    if rects is None:
+      pygame.display.update()
+    else:
+      pygame.display.update(rects)
+
+  def frame(self):
+    pass
+
+  def backlight(self, level):
+    # True/False, or 0.0-1.0 where the backlight can be dimmed
+    if self.light is None:
+      from gpsPower import findBacklight
+      self.light = findBacklight(self.backlightPin)
+      self.light.open()
+    self.light.set(float(level))
+
+  def close(self):
+    import pygame
+    if self.light is not None:
+      self.light.set(1.0) # console readable again
+      self.light.close()
+      self.light = None
+    pygame.quit()
+
+class headlessDisplay():
+
+  def __init__(self, size=(320,240), depth=16, frames=None, format='png'):
+    self.size = size
+    self.depth = depth # PiTFT is 16 bit
+    self.frames = frames # directory for PNGs or file for raw, None = keep in memory only
+    self.format = format # 'png' or 'raw'
+    self.screen = None
+    self.count = 0 # frames completed
+    self.updates = 0 # update() calls
+    self.pixels = 0 # area sent by those calls
+    self.raw = None
+    self.light = 1.0 # backlight level as last set
+
+  def open(self):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    pygame.init()
+    self.screen = pygame.Surface(self.size, 0, self.depth)
+    if self.frames:
+      if self.format == 'raw':
+        self.raw = open(self.frames, 'wb')
+      elif not os.path.isdir(self.frames):
+        os.makedirs(self.frames)
+    return self.screen
+
+  def update(self, rects=None):
+    # nothing to send anywhere, just note how much a panel would be sent
+    self.updates += 1
+    if rects is None:
+      self.pixels += self.size[0] * self.size[1]
+    else:
+      self.pixels += sum(r[2] * r[3] for r in rects)
+
+  def frame(self):
+    import pygame
+    self.count += 1
+    if self.raw is not None:
+      self.raw.write(pygame.image.tostring(self.screen, 'RGB'))
+    elif self.frames:
+      pygame.image.save(self.screen, os.path.join(self.frames, 'frame{:05d}.png'.format(self.count)))
+
+  def backlight(self, level):
+    self.light = float(level)
+
+  def close(self):
+    import pygame
+    if self.raw is not None:
+      self.raw.close()
+      self.raw = None
+    pygame.quit()
@@ -0,0 +1,128 @@
+# publish / subscribe fan-out for GPS consumers
+# every subscriber gets its own bounded queue; when a queue is full the
+# oldest item is dropped, so a slow consumer only loses its own backlog
+# and the GPS reader never waits for anyone
+# one thread can serve several subscriptions with gpsHub.wait()
+# each subscription has a pipe that holds a byte while its queue has
+# items, so waiting is a poll() on those pipes: no wakeups until there is
+# something to do, and signals get through (a Condition with a timeout
+# is a 50 ms sleep loop on Python 2)
+#
+#   fixes = gps.fixes()             # gpsFix per epoch
+#   for fix in fixes: ...
+#
+#   sky = gps.sky()                 # satView per GSV cycle
+#   raw = gps.sentences()           # every NMEA line received
+#   while True:
+#     for sub in gps.hub.wait([sky, raw], 1.0):
+#       item = sub.get(0)
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, fcntl, errno, select, threading, time
+from collections import deque
+
+class subscription():
+
+  def __init__(self, hub, topic, maxlen):
+    self.hub = hub
+    self.topic = topic
+    self.queue = deque(maxlen=maxlen)
+    self.dropped = 0 # items lost because the consumer fell behind
+    self.closed = False
+    self.rfd, self.wfd = os.pipe()
+    for fd in (self.rfd, self.wfd):
+      fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    self.signalled = False # a byte is in the pipe
+
+  def __len__(self):
+    return len(self.queue)
+
+  def signal(self):
+    # hub lock held
+    if not self.signalled:
+      self.signalled = True
+      os.write(self.wfd, 'x')
+
+  def clear(self):
+    # hub lock held, queue empty
+    if self.signalled and not self.closed:
+      self.signalled = False
+      os.read(self.rfd, 1)
+
+  def get(self, timeout=None):
+    '''oldest item, waiting up to timeout (None = forever);
+    returns None on timeout or when closed'''
+    if self.hub.wait([self], timeout):
+      return self.take()
+    return None
+
+  def take(self):
+    with self.hub.lock:
+      if not self.queue: return None
+      item = self.queue.popleft()
+      if not self.queue: self.clear()
+      return item
+
+  def __iter__(self):
+    while True:
+      item = self.get()
+      if item is None: return # closed
+      yield item
+
+  def close(self):
+    self.hub.unsubscribe(self)
+
+  def __del__(self):
+    for fd in (self.rfd, self.wfd):
+      os.close(fd)
+
+class gpsHub():
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.subs = {} # topic -> [subscription]
+
+  def subscribe(self, topic, maxlen=16):
+    sub = subscription(self, topic, maxlen)
+    with self.lock:
+      self.subs[topic] = self.subs.get(topic, []) + [sub] # copy, publish doesn't lock to read
+    return sub
+
+  def unsubscribe(self, sub):
+    with self.lock:
+      self.subs[sub.topic] = [s for s in self.subs.get(sub.topic, []) if s is not sub]
+      sub.closed = True
+      sub.signal() # left set, wakes anyone waiting on it for good
+
+  def wanted(self, topic):
+    # anyone listening? lets publishers skip building items
+    return bool(self.subs.get(topic))
+
+  def publish(self, topic, item):
+    subs = self.subs.get(topic)
+    if not subs: return
+    with self.lock:
+      for s in subs:
+        if len(s.queue) == s.queue.maxlen:
+          s.dropped += 1 # deque drops the oldest
+        s.queue.append(item)
+        s.signal()
+
+  def wait(self, subs, timeout=None):
+    '''wait until any of subs has items or is closed, returns those
+    (empty list on timeout)'''
+    end = None if timeout is None else time.time() + timeout
+    poller = select.poll()
+    for s in subs:
+      poller.register(s.rfd, select.POLLIN)
+    while True:
+      ready = [s for s in subs if s.queue or s.closed]
+      left = None if end is None else end - time.time()
+      if ready or (left is not None and left <= 0):
+        return ready
+      try:
+        poller.poll(None if left is None else int(left * 1000) + 1) # ms, rounded up
+      except select.error as e:
+        if e.args[0] != errno.EINTR: raise
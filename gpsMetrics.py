@@ -0,0 +1,136 @@
+# counters and timing histograms for the GPS and display loops
+# the hot paths test metrics.on once per chunk of serial data or per frame
+# and skip all timing when it is off, so leaving the calls in costs next
+# to nothing; counters for rare events (errors) are always kept
+#
+#   from gpsMetrics import metrics
+#   metrics.enable(statsFile='/tmp/gps-stats.json')   # rewritten every 10s
+#   metrics.enable(socket='/tmp/gps-stats.sock')      # JSON per connection
+#
+#   socat - UNIX-CONNECT:/tmp/gps-stats.sock
+#
+# timings are in seconds; histograms have power of two buckets from 10us
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, time, json, socket, threading
+from bisect import bisect_left
+
+BOUNDS = [1e-5 * 2**i for i in range(21)] # 10us .. 10s, plus one overflow bucket
+
+class histogram():
+
+  def __init__(self):
+    self.buckets = [0] * (len(BOUNDS) + 1)
+    self.count = 0
+    self.sum = 0.0
+    self.max = 0.0
+
+  def observe(self, v):
+    self.buckets[bisect_left(BOUNDS, v)] += 1
+    self.count += 1
+    self.sum += v
+    if v > self.max: self.max = v
+
+  def percentile(self, q):
+    # upper bound of the bucket holding fraction q of the samples
+    if not self.count: return None
+    run = 0
+    for i, n in enumerate(self.buckets):
+      run += n
+      if run >= q * self.count:
+        return BOUNDS[i] if i < len(BOUNDS) else self.max
+
+  def summary(self):
+    return {'count': self.count, 'sum': self.sum, 'max': self.max,
+      'mean': self.sum / self.count if self.count else None,
+      'p50': self.percentile(0.5), 'p95': self.percentile(0.95), 'p99': self.percentile(0.99)}
+
+class gpsMetrics():
+
+  def __init__(self):
+    self.on = False # hot paths check this before timing anything
+    self.counters = {}
+    self.hists = {}
+    self.sources = [] # callables returning {name: count}, read at snapshot
+    self.started = time.time()
+    self.threads = []
+    self._run = False
+
+  def count(self, name, n=1):
+    c = self.counters
+    c[name] = c.get(name, 0) + n
+
+  def observe(self, name, v):
+    h = self.hists.get(name)
+    if h is None:
+      h = self.hists[name] = histogram()
+    h.observe(v)
+
+  def source(self, fn):
+    '''add counters kept elsewhere, fn() returns {name: count};
+    values from several sources with the same name are added'''
+    self.sources.append(fn)
+
+  def snapshot(self):
+    counters = dict(self.counters)
+    for fn in self.sources:
+      for k, v in fn().items():
+        counters[k] = counters.get(k, 0) + v
+    return {'time': time.time(), 'uptime': time.time() - self.started,
+      'counters': counters,
+      'timings': dict((k, h.summary()) for k, h in self.hists.items())}
+
+  def reset(self):
+    self.counters = {}
+    self.hists = {}
+
+  def enable(self, statsFile=None, socket=None, interval=10.0):
+    '''start collecting, and exporting to a file and/or a UNIX socket'''
+    self.on = True
+    self._run = True
+    if statsFile:
+      self.spawn(self.writeFile, statsFile, interval)
+    if socket:
+      self.spawn(self.serve, socket)
+
+  def disable(self):
+    self.on = False
+    self._run = False
+
+  def spawn(self, target, *args):
+    t = threading.Thread(target = target, args = args)
+    t.daemon = True
+    t.start()
+    self.threads.append(t)
+
+  def writeFile(self, path, interval):
+    # rename over the old file so readers never see half of it
+    while self._run:
+      tmp = path + '.tmp'
+      with open(tmp, 'w') as f:
+        json.dump(self.snapshot(), f, indent=1, sort_keys=True)
+      os.rename(tmp, path)
+      time.sleep(interval)
+
+  def serve(self, path):
+    if os.path.exists(path): os.unlink(path) # left by a previous run
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(2)
+    s.settimeout(1.0) # to notice disable()
+    while self._run:
+      try:
+        conn, addr = s.accept()
+      except socket.timeout:
+        continue
+      try:
+        conn.sendall(json.dumps(self.snapshot(), sort_keys=True) + '\n')
+      except socket.error:
+        pass
+      conn.close()
+    s.close()
+    os.unlink(path)
+
+metrics = gpsMetrics() # shared by every module in the process
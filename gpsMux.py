@@ -0,0 +1,144 @@
+# several GPS receivers serviced from one thread
+# each receiver is a pyGPS with its own parser and state, but instead of
+# a reader thread per port all the ports are opened non-blocking and
+# waited on together with epoll (poll where there is no epoll)
+#
+#   mux = gpsMux()
+#   mux.add('/dev/ttyUSB0')
+#   mux.add('/dev/ttyUSB1', baudrate=4800)
+#   mux.start()
+#   fix = mux.best()          # receiver with the best fix right now
+#   fix = mux.aggregate()     # position averaged over receivers, by HDOP
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, sys, time, errno, select, threading
+from pyGPS import pyGPS, gpsFix
+
+# GGA quality, worst to best: none, estimated, GPS, DGPS, RTK float, RTK fixed
+RANK = {0: 0, 6: 1, 1: 2, 2: 3, 5: 4, 4: 5}
+
+def fixRank(fix):
+  # sort key, better fixes sort higher
+  return (RANK.get(fix.quality, 0), -(fix.hDilution or 99))
+
+def noFix(fix):
+  return fix.quality == 0 or not fix.statusOK
+
+class gpsMux():
+
+  def __init__(self, maxAge=5.0):
+    self.maxAge = maxAge # seconds without an epoch before a receiver's fix is ignored
+    self.receivers = {} # fd -> pyGPS
+    self.devices = [] # pyGPS in the order added
+    if hasattr(select, 'epoll'):
+      self.poller = select.epoll()
+      self.IN, self.BAD = select.EPOLLIN, select.EPOLLERR | select.EPOLLHUP
+    else:
+      self.poller = select.poll()
+      self.IN, self.BAD = select.POLLIN, select.POLLERR | select.POLLHUP
+    self._run = False
+    self.lock = threading.Lock()
+
+  def add(self, device, baudrate=9600, **kw):
+    '''open a receiver, returns its pyGPS; kw as for pyGPS'''
+    gps = pyGPS(device, baudrate, timeout=0, **kw) # non-blocking port
+    self.attach(gps)
+    return gps
+
+  def attach(self, gps):
+    # add a pyGPS whose port has a fileno()
+    fd = gps.port.fileno()
+    with self.lock:
+      self.receivers[fd] = gps
+      self.devices.append(gps)
+    self.poller.register(fd, self.IN)
+
+  def remove(self, gps):
+    fd = gps.port.fileno()
+    with self.lock:
+      self.receivers.pop(fd, None)
+      self.devices = [g for g in self.devices if g is not gps]
+    try:
+      self.poller.unregister(fd)
+    except (KeyError, IOError, ValueError):
+      pass
+    gps.port.close()
+
+  def poll(self, timeout=1.0):
+    '''read and parse whatever is waiting on any port'''
+    try:
+      events = self.poller.poll(timeout if hasattr(select, 'epoll') else timeout * 1000)
+    except (IOError, select.error) as e:
+      if e.args[0] != errno.EINTR: raise
+      return
+    for fd, ev in events:
+      gps = self.receivers.get(fd)
+      if gps is None: continue
+      if ev & self.IN:
+        try:
+          data = os.read(fd, 4096)
+        except OSError as e:
+          if e.errno in (errno.EAGAIN, errno.EINTR) and not ev & self.BAD:
+            continue # nothing yet, next time
+          data = ''
+        if data:
+          try:
+            gps.feed(data)
+          except Exception: # one bad receiver mustn't stop the others
+            gps.error = format(sys.exc_info()[0])
+          continue
+      if ev & self.BAD or ev & self.IN: # hangup, error or end of file
+        print 'GPS mux: lost {}'.format(gps.device)
+        self.remove(gps)
+
+  def run(self):
+    print 'GPS mux start'
+    while self._run:
+      self.poll(1.0)
+    print 'GPS mux stop'
+
+  def start(self):
+    self._run = True
+    self.thread = threading.Thread(target = self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    self._run = False
+
+  def fixes(self):
+    '''[(device, gpsFix)] for every receiver'''
+    return [(g.device, g.fix) for g in self.devices]
+
+  def current(self):
+    # fixes of receivers that have had an epoch lately, with a fix
+    now = time.time()
+    return [g.fix for g in self.devices if g.published is not None and
+      now - g.published <= self.maxAge and not noFix(g.fix)]
+
+  def best(self):
+    '''gpsFix of the receiver with the best quality, then lowest HDOP;
+    the latest fix of any receiver if none has a current fix'''
+    fixes = self.current()
+    if fixes: return max(fixes, key=fixRank)
+    if not self.devices: return None
+    return max(self.devices, key=lambda g: g.published).fix # something to show
+
+  def aggregate(self):
+    '''best fix with the position replaced by the average of every
+    receiver that has a fix, weighted by 1/HDOP squared'''
+    fixes = self.current()
+    if not fixes: return self.best()
+    best = max(fixes, key=fixRank)
+    wsum = lat = lon = 0.0
+    for f in fixes:
+      w = 1.0 / max(f.hDilution, 0.1)**2
+      wsum += w
+      lat += w * f.avg_latitude
+      lon += w * f.avg_longitude
+    kw = dict((k, getattr(best, k)) for k in gpsFix.__slots__)
+    kw['avg_latitude'] = lat / wsum
+    kw['avg_longitude'] = lon / wsum
+    return gpsFix(**kw)
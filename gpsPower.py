@@ -0,0 +1,230 @@
+# power governor for PiTFTgps
+# picks how often to redraw from what the unit is doing, and dims then
+# turns off the backlight when nobody is looking:
+#
+#   active   speed or course changing, or a button pressed lately: a frame
+#            for every fix, up to 10 a second
+#   moving   under way, steady: up to 2 frames a second, 1 without fixes
+#   still    stationary: a frame every 5 seconds
+#   dim      still and no button for dimAfter seconds: backlight dimmed,
+#            a frame every 10 seconds
+#   off      still and no button for offAfter seconds: backlight off, no
+#            frames at all until a button is pressed
+#
+#   gov = powerGovernor(display)
+#   gov.fix(fix)                # each new fix
+#   gov.input()                 # each button event
+#   draw, timeout = gov.next(fresh) # draw now, or sleep up to timeout
+#   gov.frame()                 # after each frame
+#
+# the backlight is written through sysfs files opened once and kept open,
+# not a shell per call
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, time, logging
+from collections import deque
+from gpsMetrics import metrics
+
+# mode: (shortest gap between frames with new data, longest gap without,
+# backlight level); None = never
+MODES = {
+  'active': (0.1, 1.0, 1.0),
+  'moving': (0.5, 1.0, 1.0),
+  'still':  (5.0, 5.0, 1.0),
+  'dim':    (10.0, 10.0, 0.2),
+  'off':    (None, None, 0.0),
+}
+
+class sysfsFile():
+  # a sysfs attribute opened once; writes only when the value changes
+
+  def __init__(self, path):
+    self.path = path
+    self.fd = os.open(path, os.O_WRONLY)
+    self.value = None
+
+  def write(self, value):
+    value = str(value)
+    if value == self.value: return
+    os.lseek(self.fd, 0, os.SEEK_SET)
+    os.write(self.fd, value)
+    self.value = value
+
+  def close(self):
+    if self.fd is not None:
+      os.close(self.fd)
+      self.fd = None
+
+class gpioBacklight():
+  # on/off only, e.g. the PiTFT 2.8" resistive on STMPE GPIO 252
+
+  def __init__(self, pin=252, root='/sys/class/gpio'):
+    self.pin = pin
+    self.root = root
+    self.value = None
+
+  def open(self):
+    path = os.path.join(self.root, 'gpio{}'.format(self.pin))
+    if not os.path.exists(path):
+      with open(os.path.join(self.root, 'export'), 'w') as f:
+        f.write(str(self.pin))
+    with open(os.path.join(path, 'direction'), 'w') as f:
+      f.write('out')
+    self.value = sysfsFile(os.path.join(path, 'value'))
+
+  def set(self, level):
+    self.value.write(1 if level > 0 else 0) # can't dim, on until off
+
+  def close(self):
+    if self.value is not None:
+      self.value.close()
+
+class pwmBacklight():
+  # /sys/class/backlight/<name>, brightness 0 to max_brightness
+
+  def __init__(self, path):
+    self.path = path
+    self.value = None
+    self.max = 1
+
+  def open(self):
+    with open(os.path.join(self.path, 'max_brightness')) as f:
+      self.max = int(f.read())
+    self.value = sysfsFile(os.path.join(self.path, 'brightness'))
+
+  def set(self, level):
+    self.value.write(int(round(min(max(level, 0.0), 1.0) * self.max)))
+
+  def close(self):
+    if self.value is not None:
+      self.value.close()
+
+def findBacklight(pin=252, root='/sys/class'):
+  '''a backlight device if the kernel has one, else the GPIO'''
+  path = os.path.join(root, 'backlight')
+  names = sorted(os.listdir(path)) if os.path.isdir(path) else []
+  if names:
+    return pwmBacklight(os.path.join(path, names[0]))
+  return gpioBacklight(pin, os.path.join(root, 'gpio'))
+
+def turn(a, b):
+  # smallest angle between two courses, degrees
+  d = abs(a - b) % 360
+  return min(d, 360 - d)
+
+class powerGovernor():
+
+  def __init__(self, display, dimAfter=60.0, offAfter=300.0, activeFor=10.0, stillAfter=30.0,
+      moveSpeed=1.5, speedDelta=2.0, courseDelta=15.0, clock=time.time):
+    self.display = display # backlight(level) is called on it
+    self.dimAfter = dimAfter # seconds without a button or movement, None = never
+    self.offAfter = offAfter
+    self.activeFor = activeFor # seconds at full rate after a change or button
+    self.stillAfter = stillAfter # seconds below moveSpeed before stationary
+    self.moveSpeed = moveSpeed # knots, GPS speed wanders below this when still
+    self.speedDelta = speedDelta # knots between fixes
+    self.courseDelta = courseDelta # degrees between fixes
+    self.clock = clock
+    now = clock()
+    self.lastInput = now # button
+    self.lastChange = None # speed or course
+    self.lastMove = None # above moveSpeed
+    self.lastFrame = None
+    self.speed = None
+    self.course = None
+    self.mode = None
+    self.times = deque() # frames in the last window seconds
+    self.window = 10.0
+    self.frames = 0
+    metrics.source(self.stats)
+
+  def fix(self, fix, now=None):
+    '''note speed and course of a new fix'''
+    if now is None: now = self.clock()
+    speed, course = fix.speed, fix.course
+    if speed is None: return
+    if self.speed is not None and abs(speed - self.speed) >= self.speedDelta:
+      self.lastChange = now
+    if speed >= self.moveSpeed:
+      self.lastMove = now
+      if course is not None and self.course is not None and turn(course, self.course) >= self.courseDelta:
+        self.lastChange = now
+      self.course = course
+    else:
+      self.course = None # meaningless when still
+    self.speed = speed
+
+  def input(self, now=None):
+    '''a button was used, True if that woke the display'''
+    if now is None: now = self.clock()
+    self.lastInput = now
+    return self.mode in ('dim', 'off')
+
+  def transitions(self, now):
+    # mode and the time it next changes by itself
+    recent = max(self.lastInput, self.lastChange or 0)
+    if now - recent < self.activeFor:
+      return 'active', recent + self.activeFor
+    if self.lastMove is not None and now - self.lastMove < self.stillAfter:
+      return 'moving', self.lastMove + self.stillAfter
+    idle = max(self.lastInput, self.lastMove or 0)
+    if self.offAfter is not None and now - idle >= self.offAfter:
+      return 'off', None
+    if self.dimAfter is not None and now - idle >= self.dimAfter:
+      return 'dim', idle + self.offAfter if self.offAfter is not None else None
+    at = [idle + t for t in (self.dimAfter, self.offAfter) if t is not None]
+    return 'still', min(at) if at else None
+
+  def update(self, now=None):
+    '''mode for now, setting the backlight when it changes'''
+    if now is None: now = self.clock()
+    mode, changeAt = self.transitions(now)
+    if mode != self.mode:
+      old, self.mode = self.mode, mode
+      self.display.backlight(MODES[mode][2])
+      fastest = MODES[mode][0]
+      logging.info('power: {} -> {}, up to {} fps, now {:.1f} fps'.format(old, mode,
+        '{:g}'.format(1 / fastest) if fastest else 0, self.rate(now)))
+      if metrics.on: metrics.count('power.' + mode)
+    return mode, changeAt
+
+  def next(self, fresh, now=None):
+    '''(draw, timeout): draw a frame now, or sleep for up to timeout
+    seconds (None = until a fix or button); fresh if there is new data
+    since the last frame'''
+    if now is None: now = self.clock()
+    mode, changeAt = self.update(now)
+    shortest, longest, level = MODES[mode]
+    gap = shortest if fresh else longest
+    if gap is None:
+      at = None
+    elif self.lastFrame is None:
+      return True, 0
+    else:
+      at = self.lastFrame + gap
+      if at <= now: return True, 0
+    wake = [t for t in (at, changeAt) if t is not None]
+    return False, max(min(wake) - now, 0) if wake else None
+
+  def frame(self, now=None):
+    if now is None: now = self.clock()
+    self.lastFrame = now
+    self.frames += 1
+    self.times.append(now)
+    self.trim(now) # only the window is kept, however long we run
+
+  def trim(self, now):
+    times = self.times
+    while times and times[0] <= now - self.window:
+      times.popleft()
+
+  def rate(self, now=None):
+    '''frames a second over the last window seconds'''
+    if now is None: now = self.clock()
+    self.trim(now)
+    return len(self.times) / self.window
+
+  def stats(self):
+    return {'power.fps': self.rate(), 'power.frames': self.frames}
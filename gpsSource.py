@@ -0,0 +1,223 @@
+# NMEA input sources that stand in for the serial port
+# replaySource plays a recorded NMEA log through the same read() / inWaiting()
+# calls pyGPS makes on a serial.Serial, at real time, N times real time,
+# or as fast as it can be read
+# ptyReceiver serves any source on a pseudo-terminal so the normal serial
+# path can open it like a real receiver
+# mtkReceiver is a ptyReceiver that also answers PMTK commands like an MTK
+# chipset: it acks them, filters its output by the PMTK314 sentence rates
+# and only makes sense to a port set to its baud rate (PMTK251)
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, sys, time, tty, termios, select, fcntl
+import threading
+from nmeaParser import nmeaSeconds, checkBuffer
+from pmtkConfig import pmtk, SENTENCES
+
+class replaySource():
+
+  def __init__(self, filename, rate=1.0, loop=False, timeout=3.0):
+    self.filename = filename
+    self.rate = rate # 1.0 = real time, 100 = 100x, None or 0 = unthrottled
+    self.loop = loop # start over at end of file
+    self.timeout = timeout # read() wait at end of file, like serial timeout
+    self.file = open(filename, 'rb')
+    self.buf = '' # data released but not yet read
+    self.pending = None # next line, not yet due
+    self.t0 = None # wall clock time of the first epoch
+    self.g0 = None # log time of the first epoch
+    self.gtime = None # log time of the current epoch
+    self.eof = False
+
+  def close(self):
+    self.file.close()
+
+  def due(self, line):
+    # wall clock time at which a line should be released
+    if not self.rate or line[3:6] not in ('GGA', 'RMC', 'ZDA', 'GLL'):
+      return 0
+    g = nmeaSeconds(line[7:line.find(',', 7)])
+    if g is None or g == self.gtime:
+      return 0
+    if self.gtime is None or g < self.gtime: # first epoch, midnight or log restart
+      self.t0 = time.time()
+      self.g0 = g
+    self.gtime = g
+    return self.t0 + (g - self.g0) / self.rate
+
+  def fill(self, block):
+    # move lines that are due into buf, wait for the next one if block
+    while True:
+      if self.pending is None:
+        line = self.file.readline()
+        if not line:
+          if not self.loop:
+            self.eof = True
+            return
+          self.file.seek(0)
+          self.gtime = None
+          continue
+        self.pending = (line, self.due(line))
+      line, t = self.pending
+      wait = t - time.time()
+      if wait > 0:
+        if not block or self.buf: return
+        time.sleep(wait)
+      self.buf += line
+      self.pending = None
+      if block or len(self.buf) >= 4096: return
+
+  def inWaiting(self):
+    self.fill(False)
+    return len(self.buf)
+
+  def read(self, size=1):
+    if not self.buf:
+      self.fill(True)
+      if not self.buf: # end of log, behave like a serial timeout
+        time.sleep(self.timeout)
+        return ''
+    data = self.buf[:size]
+    self.buf = self.buf[size:]
+    return data
+
+  def readline(self):
+    while '\n' not in self.buf and not self.eof:
+      self.fill(True)
+    i = self.buf.find('\n') + 1 or len(self.buf)
+    data = self.buf[:i]
+    self.buf = self.buf[i:]
+    return data
+
+class ptyReceiver():
+
+  def __init__(self, source):
+    self.source = source # anything with read() and inWaiting()
+    self.master, self.slave = os.openpty()
+    tty.setraw(self.slave) # no echo or line editing on the receiver side
+    self.device = os.ttyname(self.slave) # open this with serial.Serial
+    fcntl.fcntl(self.master, fcntl.F_SETFL, fcntl.fcntl(self.master, fcntl.F_GETFL) | os.O_NONBLOCK)
+    self.wake = os.pipe() # close() writes here so run() never stays blocked
+    self._run = False
+
+  def send(self, data):
+    # all of data, unless close() comes while the other end isn't reading
+    while data and self._run:
+      r, w, x = select.select([self.wake[0]], [self.master], [])
+      if w:
+        data = data[os.write(self.master, data):]
+
+  def run(self):
+    src = self.source
+    while self._run:
+      n = src.inWaiting() # never blocks, read() can sleep for seconds
+      if n:
+        self.send(src.read(n))
+      else:
+        select.select([self.wake[0]], [], [], 0.02)
+
+  def start(self):
+    self._run = True
+    self.thread = threading.Thread(target = self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    self._run = False
+
+  def close(self):
+    self.stop()
+    os.write(self.wake[1], 'x')
+    if hasattr(self, 'thread'):
+      self.thread.join() # it uses the fds until it has gone
+    for fd in (self.master, self.slave) + self.wake:
+      os.close(fd)
+
+class mtkReceiver(ptyReceiver):
+
+  def __init__(self, source, baud=9600):
+    ptyReceiver.__init__(self, source)
+    self.baud = baud # line speed the "receiver" sends at
+    self.interval = 1000 # ms, PMTK220
+    self.mask = None # PMTK314 rates by sentence, None = send everything
+    self.commands = [] # PMTK commands received, for tests
+    self.fixes = 0 # RMCs sent, for sentences sent every N fixes
+    self.cmdbuf = ''
+    self.outbuf = ''
+
+  def matched(self):
+    # is the other end of the pty set to our speed
+    attr = termios.tcgetattr(self.slave)
+    return attr[5] == getattr(termios, 'B{}'.format(self.baud), None)
+
+  def write(self, data):
+    if not self.matched(): # wrong speed, the other end sees garbage
+      data = ''.join(chr(ord(c) ^ 0x55) for c in data)
+    self.send(data)
+
+  def run(self):
+    src = self.source
+    while self._run:
+      r, w, x = select.select([self.master, self.wake[0]], [], [], 0.02)
+      if not self._run: break
+      if self.master in r:
+        self.command(os.read(self.master, 256))
+      n = src.inWaiting()
+      if n:
+        self.output(src.read(n))
+
+  def command(self, data):
+    if not self.matched(): return # can't make sense of it
+    self.cmdbuf += data
+    i = self.cmdbuf.rfind('\n') + 1
+    done, self.cmdbuf = self.cmdbuf[:i], self.cmdbuf[i:]
+    for line, ok in checkBuffer(done):
+      line = line[line.find('$'):]
+      if not ok or not line.startswith('$PMTK'): continue
+      f = line[1:line.find('*')].split(',')
+      cmd = f[0][4:]
+      self.commands.append(line)
+      if cmd == '251' and len(f) == 2: # no ack, new speed at once
+        self.baud = int(f[1])
+        continue
+      flag = 1 # unsupported
+      if cmd == '220':
+        flag = 0 # invalid
+        if len(f) == 2 and f[1].isdigit() and 100 <= int(f[1]) <= 10000:
+          self.interval = int(f[1])
+          flag = 3
+      elif cmd == '314':
+        flag = 0
+        if len(f) == 20 and all(v.isdigit() for v in f[1:]):
+          self.mask = dict(zip(SENTENCES, map(int, f[1:])))
+          flag = 3
+      self.write(pmtk('PMTK001,{},{}'.format(cmd, flag)))
+
+  def output(self, data):
+    self.outbuf += data
+    i = self.outbuf.rfind('\n') + 1
+    done, self.outbuf = self.outbuf[:i], self.outbuf[i:]
+    if self.mask is None:
+      self.write(done)
+      return
+    out = []
+    for line in done.splitlines(True):
+      kind = line[3:6].lower()
+      n = self.mask.get(kind, 0)
+      if n and self.fixes % n == 0:
+        out.append(line)
+      if kind == 'rmc': self.fixes += 1
+    if out: self.write(''.join(out))
+
+if __name__ == '__main__':
+  # serve a recorded log on a pty: python gpsSource.py log.nmea [rate]
+  rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+  rcvr = ptyReceiver(replaySource(sys.argv[1], rate=rate, loop=True))
+  print 'replaying {} at {}x on {}'.format(sys.argv[1], rate, rcvr.device)
+  rcvr.start()
+  try:
+    while True: time.sleep(1)
+  except KeyboardInterrupt:
+    rcvr.close()
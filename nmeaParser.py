@@ -0,0 +1,186 @@
+# NMEA 0183 parser engine
+# takes raw serial data in chunks of any size, frames the sentences
+# and splits each one into its fields in a single pass
+# field decoders for RMC, GGA, GSV are shared by pyGPS and offline tools
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math, struct
+from operator import xor
+from gpsMetrics import metrics
+
+def c2Float(str):
+  # 0 for an empty field, counted as an error only if it isn't a number
+  if not str: return 0
+  try:
+     return float(str)
+  except ValueError:
+     metrics.count('nmea.convertErrors')
+     return 0
+
+def c2Int(str):
+  if not str: return 0
+  try:
+     return int(str)
+  except ValueError:
+     metrics.count('nmea.convertErrors')
+     return 0
+
+# checksum tables: hex trailer to value, and a struct per whole number of
+# 8 byte words so most of a sentence is XORed a word at a time
+_HEX = {}
+for i in range(256):
+  _HEX['%02X' % i] = i
+  _HEX['%02x' % i] = i
+del i
+_WORDS = [struct.Struct('<%dQ' % n) for n in range(16)] # up to 128 chars
+
+def nmeaSum(line, start, end):
+  # XOR of the characters between '$' at start and '*' at end
+  n = (end - start - 1) >> 3 # whole words
+  chk = 0
+  if n:
+    if n < 16:
+      w = reduce(xor, _WORDS[n].unpack_from(line, start+1))
+    else:
+      w = reduce(xor, struct.unpack_from('<%dQ' % n, line, start+1))
+    w ^= w >> 32
+    w ^= w >> 16
+    chk = (w ^ (w >> 8)) & 0xff
+  for ch in line[start+1+(n<<3):end]: # 0-7 chars left over
+    chk ^= ord(ch)
+  return chk
+
+def checksum(line, start, end):
+  # True if the sentence matches its *hh trailer
+  return nmeaSum(line, start, end) == _HEX.get(line[end+1:end+3])
+
+def checkBuffer(data):
+  '''validate every complete sentence in a buffer,
+  returns a list of (sentence, ok) without the line endings'''
+  out = []
+  lines = data.split('\n')
+  lines.pop() # partial sentence or ''
+  for line in lines:
+    s = line.find('$')
+    if s < 0: continue
+    e = line.rfind('*')
+    line = line.rstrip('\r')
+    out.append((line, e > s and checksum(line, s, e)))
+  return out
+
+class nmeaParser():
+
+  def __init__(self, accept=None, maxline=256):
+    self.buf = '' # partial sentence left over from the last chunk
+    self.accept = accept # set of addresses to decode, None = all
+    self.maxline = maxline # longest partial sentence kept (NMEA max is 82)
+    self.sentences = 0 # sentences framed
+    self.skipped = 0 # sentences not in accept
+    self.badsum = 0 # checksum errors, all sentences
+    self.badsums = {} # checksum errors by address
+    self.overruns = 0 # partial sentences discarded
+    self.tap = None # called with every sentence line, before any filtering
+
+  def feed(self, data):
+    '''add a chunk of raw data, return a list of (address, fields)
+    for every complete sentence; address is e.g. "GPGGA", fields are
+    the comma separated values between the address and the "*"'''
+    if self.buf:
+      data = self.buf + data
+    lines = data.split('\n')
+    self.buf = lines.pop() # incomplete sentence, finish on next chunk
+    if len(self.buf) > self.maxline: # no line end, garbage on the line?
+      self.buf = ''
+      self.overruns += 1
+    out = []
+    accept = self.accept
+    tap = self.tap
+    for line in lines:
+      s = line.find('$')
+      if s < 0: continue
+      if tap is not None: tap(line[s:].rstrip('\r'))
+      self.sentences += 1
+      addr = line[s+1:s+6]
+      if accept is not None and addr not in accept:
+        self.skipped += 1
+        continue
+      e = line.rfind('*')
+      if e < s or not checksum(line, s, e):
+        self.badsum += 1
+        self.badsums[addr] = self.badsums.get(addr, 0) + 1
+        continue
+      out.append((addr, line[s+7:e].split(',')))
+    return out
+
+# ---------------------------------------------------------------------
+# field decoders, all take the field list returned by nmeaParser.feed
+
+def latlon(v, hemi):
+  # ddmm.mmmm to decimal degrees, negative for S or W
+  d = c2Float(v)
+  d = d//100 + (d%100)/60.0
+  if hemi == 'S' or hemi == 'W': d = -d
+  return d
+
+def nmeaSeconds(t):
+  # hhmmss.sss to seconds since midnight, None if not a time
+  try:
+    return int(t[0:2])*3600 + int(t[2:4])*60 + float(t[4:])
+  except ValueError:
+    return None
+
+def parseGGA(f):
+  '''returns (time, lat, lon, quality, nsats, hDilution, altitude, geodiff)
+  time is hhmmss.sss as sent, lat/lon in degrees'''
+  return (f[0], latlon(f[1], f[2]), latlon(f[3], f[4]),
+    c2Int(f[5]), c2Int(f[6]), c2Float(f[7]), c2Float(f[8]), c2Float(f[10]))
+
+def parseRMC(f):
+  '''returns (time, status, lat, lon, speed, course, date)
+  time is hhmmss.sss and date ddmmyy as sent, speed & course are strings'''
+  return (f[0], f[1], latlon(f[2], f[3]), latlon(f[4], f[5]),
+    f[6], f[7], f[8])
+
+def parseGSV(f):
+  '''returns (nmsgs, msgn, nsats, sats)
+  sats is a list of (svn, alt, azi, snr), alt & azi in radians'''
+  sats = []
+  radians = math.radians
+  for i in xrange(3, len(f) - 3, 4): # groups of 4, ignores a trailing signal id
+    svn, alt, azi, snr = f[i:i+4]
+    if not svn.isdigit():
+      break
+    try:
+      sats.append((svn, radians(int(alt)) if alt else 0.0,
+        radians(int(azi)) if azi else 0.0, int(snr) if snr else 0))
+    except ValueError: # garbage in a field, treat as missing
+      sats.append((svn, radians(int(alt)) if alt.isdigit() else 0.0,
+        radians(int(azi)) if azi.isdigit() else 0.0, int(snr) if snr.isdigit() else 0))
+  return (f[0], f[1], f[2], sats)
+
+def optFloat(v):
+  # float of an optional field, None if empty
+  return float(v) if v else None
+
+def parseGSA(f):
+  '''returns (fixType, prns, pdop, hdop, vdop)
+  fixType 1 = none, 2 = 2D, 3 = 3D, prns are the satellites used'''
+  return (c2Int(f[1]), [p for p in f[2:14] if p], optFloat(f[14]),
+    optFloat(f[15]), optFloat(f[16]))
+
+def parseVTG(f):
+  '''returns (course, speed), course true in degrees, speed in knots,
+  None when not moving or not known'''
+  if len(f) > 5 and f[1] == 'T':
+    return (optFloat(f[0]), optFloat(f[4]))
+  return (optFloat(f[0]), optFloat(f[2])) # NMEA 1.5, no unit fields
+
+def parseGLL(f):
+  '''returns (time, status, lat, lon), lat/lon in degrees'''
+  return (f[4], f[5], latlon(f[0], f[1]), latlon(f[2], f[3]))
+
+def parseZDA(f):
+  '''returns (time, day, month, year)'''
+  return (f[0], c2Int(f[1]), c2Int(f[2]), c2Int(f[3]))
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+
+# offline statistics for recorded NMEA logs
+# each log is cut into chunks at sentence boundaries and the chunks are
+# parsed by a pool of worker processes with the same nmeaParser and field
+# decoders pyGPS uses; the per chunk counts are then merged per file
+#
+#   python nmeaStats.py field/*.nmea              # summary per file
+#   python nmeaStats.py -j 8 -o stats.json big.nmea
+#
+# reports fix availability, HDOP and satellites used distributions,
+# SNR per satellite and the checksum error rate
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, json
+import argparse
+import multiprocessing
+from nmeaParser import nmeaParser, parseGGA, parseGSV
+from satTable import SYSTEM, label
+
+CHUNK = 16 << 20 # bytes per work item
+HDOPBIN = 0.5 # width of an HDOP histogram bin
+HDOPMAX = 20 # bins above this go in the last one
+
+def chunks(filename, size=CHUNK):
+  # (filename, start, end) byte ranges covering the file
+  n = os.path.getsize(filename)
+  return [(filename, s, min(s + size, n)) for s in range(0, n, size)] or [(filename, 0, 0)]
+
+def readChunk(filename, start, end):
+  # the sentences that start in [start, end), whole
+  with open(filename, 'rb') as f:
+    if start:
+      f.seek(start - 1)
+      f.readline() # belongs to the chunk before, unless it ends right at start
+    pos = f.tell()
+    if pos >= end: return ''
+    data = f.read(end - pos)
+    if data and data[-1] != '\n':
+      data += f.readline()
+  return data
+
+def newStats():
+  return {'bytes': 0, 'sentences': 0, 'badsum': 0, 'overruns': 0, 'types': {},
+    'gga': 0, 'fixes': 0, 'quality': {}, 'hdop': {}, 'nsats': {},
+    'snr': {}} # snr: sat -> [count, sum, min, max, zero]
+
+def count(d, k, n=1):
+  d[k] = d.get(k, 0) + n
+
+def analyse(job):
+  '''stats for one chunk, runs in a worker'''
+  filename, start, end = job
+  data = readChunk(filename, start, end)
+  st = newStats()
+  st['bytes'] = len(data)
+  p = nmeaParser()
+  types, snr = st['types'], st['snr']
+  for addr, f in p.feed(data + '\n'): # + '\n' in case the file ends mid line
+    kind = addr[2:]
+    count(types, kind)
+    try:
+      if kind == 'GGA':
+        gtime, lat, lon, quality, nsats, hdop, alt, geodiff = parseGGA(f)
+        st['gga'] += 1
+        count(st['quality'], quality)
+        if quality > 0:
+          st['fixes'] += 1
+          count(st['hdop'], min(int(hdop / HDOPBIN), int(HDOPMAX / HDOPBIN)))
+          count(st['nsats'], nsats)
+      elif kind == 'GSV':
+        sys = SYSTEM.get(addr[:2], 0)
+        for svn, alt, azi, s in parseGSV(f)[3]:
+          svn = int(svn)
+          key = label(1 if addr[:2] == 'GN' and svn > 64 else sys, svn) # GLONASS in a GN cycle
+          v = snr.get(key)
+          if v is None:
+            v = snr[key] = [0, 0, 255, 0, 0]
+          if s == 0: # in view, not tracked
+            v[4] += 1
+            continue
+          v[0] += 1
+          v[1] += s
+          if s < v[2]: v[2] = s
+          if s > v[3]: v[3] = s
+    except (IndexError, ValueError): # short or mangled sentence that passed the checksum
+      count(types, 'bad')
+  st['sentences'] = p.sentences
+  st['badsum'] = p.badsum
+  st['overruns'] = p.overruns
+  return filename, st
+
+def merge(a, b):
+  # add the counts of b into a
+  for k, v in b.items():
+    if k == 'snr':
+      for sat, s in v.items():
+        t = a['snr'].get(sat)
+        if t is None:
+          a['snr'][sat] = list(s)
+        else:
+          t[0] += s[0]; t[1] += s[1]; t[4] += s[4]
+          t[2] = min(t[2], s[2]); t[3] = max(t[3], s[3])
+    elif isinstance(v, dict):
+      for kk, n in v.items():
+        count(a[k], kk, n)
+    else:
+      a[k] += v
+  return a
+
+def summary(st):
+  '''the merged counts turned into the reported figures'''
+  out = {'bytes': st['bytes'], 'sentences': st['sentences'], 'types': st['types'],
+    'checksumErrors': st['badsum'],
+    'checksumErrorRate': float(st['badsum']) / st['sentences'] if st['sentences'] else 0.0,
+    'overruns': st['overruns'],
+    'epochs': st['gga'], 'fixes': st['fixes'],
+    'fixAvailability': float(st['fixes']) / st['gga'] if st['gga'] else 0.0,
+    'quality': dict((str(k), v) for k, v in sorted(st['quality'].items())),
+    'hdop': dict(('{:.1f}'.format(k * HDOPBIN), v) for k, v in sorted(st['hdop'].items())),
+    'nsats': dict((str(k), v) for k, v in sorted(st['nsats'].items()))}
+  snr = {}
+  for sat, (n, total, lo, hi, zero) in sorted(st['snr'].items()):
+    snr[sat] = {'tracked': n, 'untracked': zero,
+      'mean': round(float(total) / n, 1) if n else None,
+      'min': lo if n else None, 'max': hi if n else None}
+  out['snr'] = snr
+  return out
+
+def percentile(hist, q):
+  # value at fraction q of a {value: count} histogram
+  total = sum(hist.values())
+  if not total: return None
+  run = 0
+  for k in sorted(hist):
+    run += hist[k]
+    if run >= q * total: return k
+
+def show(filename, st, s):
+  print filename
+  print '  {:,} bytes, {:,} sentences, {} checksum errors ({:.3%})'.format(
+    s['bytes'], s['sentences'], s['checksumErrors'], s['checksumErrorRate'])
+  print '  fix in {:,} of {:,} epochs ({:.1%})'.format(s['fixes'], s['epochs'], s['fixAvailability'])
+  if st['hdop']:
+    print '  HDOP median {:.1f}, 95% {:.1f}'.format(percentile(st['hdop'], 0.5) * HDOPBIN,
+      percentile(st['hdop'], 0.95) * HDOPBIN)
+  if st['nsats']:
+    print '  satellites used min {}, median {}, max {}'.format(min(st['nsats']),
+      percentile(st['nsats'], 0.5), max(st['nsats']))
+  for sat, v in sorted(s['snr'].items()):
+    if v['tracked']:
+      print '  {:>4} SNR {:4.1f} ({}-{}) x{}'.format(sat, v['mean'], v['min'], v['max'], v['tracked'])
+
+def main():
+  ap = argparse.ArgumentParser(description='statistics for NMEA logs')
+  ap.add_argument('logs', nargs='+')
+  ap.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(), help='worker processes')
+  ap.add_argument('-c', '--chunk', type=int, default=CHUNK >> 20, help='chunk size in MB')
+  ap.add_argument('-o', '--output', help='write JSON results to this file')
+  ap.add_argument('-q', '--quiet', action='store_true', help='no summary on stdout')
+  args = ap.parse_args()
+  jobs = []
+  for name in args.logs:
+    jobs.extend(chunks(name, max(args.chunk, 1) << 20))
+  stats = dict((name, newStats()) for name in args.logs)
+  if args.jobs > 1 and len(jobs) > 1:
+    pool = multiprocessing.Pool(args.jobs)
+    results = pool.imap_unordered(analyse, jobs)
+  else:
+    pool = None
+    results = (analyse(j) for j in jobs)
+  for name, st in results:
+    merge(stats[name], st)
+  if pool:
+    pool.close()
+    pool.join()
+  out = {}
+  for name in args.logs:
+    out[name] = summary(stats[name])
+    if not args.quiet:
+      show(name, stats[name], out[name])
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(out, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+  main()
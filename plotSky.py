@@ -6,12 +6,19 @@
 
 import pygame
 from pygame.locals import *
-import math
+import numpy as np
+import os
 import ephem, ephem.stars
+from starCatalog import starCatalog
+from ephemService import ephemService
+from fontCache import getFont, render
+from skyProjection import getxy
 
-R90 = math.radians(90) # 90 degrees in radians
-
-stars = []
+# a full catalog is used if one is installed next to this file,
+# otherwise the named ephem stars
+catalogFiles = ['bsc5.dat', 'stars.csv']
+maxMag = 6.5 # faintest star plotted
+pixelMag = 4.5 # stars fainter than this are single pixels
 
 #stardata = ephem.stars.db.split("\n")
 #for startxt in stardata:
@@ -30,26 +37,20 @@ starnames = ['Polaris','Sirius','Canopus','Arcturus','Vega','Capella','Rigel','P
   'Rasalgethi','Nihal','Algenib','Alcyone','Vindemiatrix','Sadalmelik','Zaurak','Minkar','Albereo',
   'Alfirk','Sulafat','Megrez','Sheliak','Atlas','Thuban','Alshain','Electra','Maia','Arkab Prior','Rukbat','Alcor',
   'Merope','Arkab Posterior','Taygeta']
-for name in starnames:
-  stars.append(ephem.star(name))
-del starnames
 
-#print 'Stars: {}'.format(len(stars))
+def loadStars():
+  here = os.path.dirname(os.path.abspath(__file__))
+  for fn in catalogFiles:
+    fn = os.path.join(here, fn)
+    if os.path.exists(fn):
+      return starCatalog(fn, maxmag=maxMag)
+  return starCatalog(names=starnames)
+
+stars = loadStars()
 
-centerX = 160 # center of sky circle
-centerY = 120
-diameter = 120
-
-def getxy(alt, azi): # alt, az in radians
-# thanks to John at Wobbleworks for the algorithm
-#    r90 = math.radians(90) # 90 degrees in radians (1.5707963267948966)
-    r = (R90 - alt)/R90
-    x = r * math.sin(azi)
-    y = r * math.cos(azi)
-#    x = int(centerX - x * diameter) # flip E/W, scale to radius, center on plot
-    x = int(centerX + x * diameter) # scale to radius, center on plot
-    y = int(centerY - y * diameter) # scale to radius, center on plot
-    return (x,y)
+ephemeris = ephemService() # Sun, Moon & planets, shared with the main loop
+
+#print 'Stars: {}'.format(len(stars))
 
 class plotStars():
 
@@ -58,16 +59,23 @@ class plotStars():
     self.obs = obs
     self.sun = sun
 
-    for star in stars:
-        star.compute(self.obs)
-        if star.alt > 0:
-          sz = int(3-star.mag + 0.5) # use vmag of brighter stars for size
-          if sz<=1: # minimum radius - pygame draws small circles as funny squares
-            pygame.draw.circle(self.screen, (255,255,255), getxy(star.alt, star.az), 1, 1)
-          else:
-            pygame.draw.circle(self.screen, (255,255,255), getxy(star.alt, star.az), sz, 0)
-#            print 'star {} mag {} sz {}'.format(star.name, star.mag, sz)
-        del star
+    x, y, mag = stars.project(self.obs)
+    sz = (3 - mag + 0.5).astype(int) # use vmag of brighter stars for size
+    white = (255,255,255)
+    bright = (mag < pixelMag).nonzero()[0]
+    for i in bright: # few of these, draw as before
+        xy = (int(x[i]), int(y[i]))
+        if sz[i]<=1: # minimum radius - pygame draws small circles as funny squares
+          pygame.draw.circle(self.screen, white, xy, 1, 1)
+        else:
+          pygame.draw.circle(self.screen, white, xy, int(sz[i]), 0)
+    faint = mag >= pixelMag
+    if faint.any(): # single pixels, dimmer with magnitude, all at once
+        grey = np.array([self.screen.map_rgb((l,l,l)) for l in range(256)])
+        level = np.clip(255 - (mag[faint] - pixelMag) * 60, 64, 255).astype(int)
+        pix = pygame.surfarray.pixels2d(self.screen)
+        pix[x[faint], y[faint]] = grey[level]
+        del pix # unlock the surface
 
 # plot 5 circles to test plot
 #    pygame.draw.circle(screen, (0,255,0), getxy(math.radians(90), math.radians(0)), 5, 1) # center
@@ -84,36 +92,37 @@ class plotPlanets():
     self.obs = obs
     self.sun = sun
     self.pline = 235
-    self.pFont = pygame.font.SysFont('Arial', 16, bold=True)
+    self.pFont = getFont('Arial', 16, bold=True)
+    self.drawn = [] # (name, xy) of each body drawn, to tell if anything moved
+    self.rects = [] # areas drawn on
 
     # plot the naked eye planets
-    self.plotPlanet(ephem.Saturn(), (245,128,245), 3)
-    self.plotPlanet(ephem.Jupiter(),(245,245,128), 3)
-    self.plotPlanet(ephem.Mars(),  (245,0,0), 3)
-    self.plotPlanet(ephem.Venus(), (245,245,245), 3)
-    self.plotPlanet(ephem.Mercury(), (128,245,245), 3)
-
-    moon = ephem.Moon()
-    moon.compute(obs)
+    self.plotPlanet('Saturn', (245,128,245), 3)
+    self.plotPlanet('Jupiter',(245,245,128), 3)
+    self.plotPlanet('Mars',  (245,0,0), 3)
+    self.plotPlanet('Venus', (245,245,245), 3)
+    self.plotPlanet('Mercury', (128,245,245), 3)
+
+    moon = ephemeris.position('Moon', obs)
     if (moon.alt>0):
-      pygame.draw.circle(self.screen, (255,255,255), getxy(moon.alt, moon.az), 7, 0)
-      txt = self.pFont.render('Moon', 1, (255,255,255))
-      self.pline -= 15
-      self.screen.blit(txt, (1,self.pline))
+      self.plotBody('Moon', (255,255,255), 7, getxy(moon.alt, moon.az))
 
     if (sun.alt>0):
-      pygame.draw.circle(self.screen, (255,255,0), getxy(sun.alt, sun.az), 7, 0)
-      txt = self.pFont.render('Sun', 1, (255,255,0))
-      self.pline -= 15
-      self.screen.blit(txt, (1, self.pline))
+      self.plotBody('Sun', (255,255,0), 7, getxy(sun.alt, sun.az))
 
 
-  def plotPlanet(self, planet, color, size):
-    planet.compute(self.obs)
+  def plotPlanet(self, name, color, size):
+    planet = ephemeris.position(name, self.obs)
 #    print "{} alt: {} az:{}".format(planet.name, math.degrees(planet.alt), math.degrees(planet.az))
     if (planet.alt>0):
-      pygame.draw.circle(self.screen, color, getxy(planet.alt, planet.az), size, 0)
-      txt = self.pFont.render(planet.name, 1, color, (0,0,0))
-      self.pline -= 15
-      self.screen.blit(txt, (1, self.pline))
+      self.plotBody(planet.name, color, size, getxy(planet.alt, planet.az), (0,0,0))
+
+  def plotBody(self, name, color, size, xy, bg=(0,0,0)):
+    # the body on the chart and its name in the list at bottom left
+    # labels go on a colour keyed layer: antialias them against black, not the key
+    self.rects.append(pygame.draw.circle(self.screen, color, xy, size, 0))
+    txt = render(self.pFont, name, color, bg)
+    self.pline -= 15
+    self.rects.append(self.screen.blit(txt, (1, self.pline)))
+    self.drawn.append((name, xy))
 
@@ -0,0 +1,144 @@
+# receiver configuration for MediaTek (MTK) GPS chipsets, e.g. the
+# Adafruit Ultimate GPS, with PMTK commands:
+#
+#   PMTK251,baud     serial speed, takes effect at once, no ack
+#   PMTK220,ms       fix interval, 100 ms = 10 Hz
+#   PMTK314,...      output rate of each sentence, in fixes (0 = off)
+#   PMTK001,cmd,f    ack: 0 invalid, 1 unsupported, 2 failed, 3 done
+#
+#   cfg = pmtkConfig(gps.port)          # before gps.start()
+#   cfg.detectBaud()                    # speed the receiver is sending at
+#   cfg.setBaud(115200)
+#   cfg.setRate(10)
+#   cfg.setSentences(gga=1, rmc=1, gsv=5) # GSV every 5th fix, nothing else
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import time
+from nmeaParser import nmeaSum, checkBuffer
+
+BAUDS = (9600, 115200, 57600, 38400, 19200, 4800) # most likely first
+# PMTK314 field order, the rest of the 19 fields are reserved
+SENTENCES = ('gll', 'rmc', 'vtg', 'gga', 'gsa', 'gsv')
+ACKS = {0: 'invalid', 1: 'unsupported', 2: 'failed', 3: 'ok'}
+EPOCHBYTES = 80 # GGA or RMC, about, for the baud rate check
+
+def pmtk(body):
+  '''a complete PMTK sentence for body, e.g. "PMTK220,100"'''
+  s = '$' + body + '*'
+  return '{}{:02X}\r\n'.format(s, nmeaSum(s, 0, len(s) - 1))
+
+class pmtkConfig():
+
+  def __init__(self, port, timeout=1.0, retries=3):
+    self.port = port # serial.Serial, or anything with write/read/inWaiting/baudrate
+    self.timeout = timeout # seconds to wait for an ack
+    self.retries = retries
+    self.buf = ''
+    self.rate = 1 # Hz, as last set
+    self.mask = None # sentence rates as last set
+
+  def send(self, body):
+    self.port.write(pmtk(body))
+    self.port.flush() # all out before anything else changes
+
+  def lines(self, timeout):
+    # valid sentences received within timeout
+    end = time.time() + timeout
+    while time.time() < end:
+      port = self.port
+      data = port.read(port.inWaiting() or 1)
+      if not data: continue
+      self.buf += data
+      if '\n' not in data: continue
+      i = self.buf.rfind('\n') + 1
+      done, self.buf = self.buf[:i], self.buf[i:]
+      for line, ok in checkBuffer(done):
+        if ok: yield line[line.find('$'):]
+
+  def command(self, body):
+    '''send a command and wait for its PMTK001, returns the ack flag
+    (3 = done, see ACKS) or None if the receiver never answered'''
+    cmd = body[4:7]
+    for attempt in range(self.retries):
+      self.send(body)
+      for line in self.lines(self.timeout):
+        if line.startswith('$PMTK001,' + cmd + ','):
+          flag = int(line[13:line.find('*')])
+          if flag != 3:
+            print 'PMTK{}: {}'.format(cmd, ACKS.get(flag, flag))
+          return flag
+    print 'PMTK{}: no ack'.format(cmd)
+    return None
+
+  def listen(self, timeout, need=2):
+    # True once need sentences with good checksums have arrived
+    n = 0
+    for line in self.lines(timeout):
+      n += 1
+      if n >= need: return True
+    return False
+
+  def setSpeed(self, baud):
+    port = self.port
+    port.baudrate = baud
+    if hasattr(port, 'reset_input_buffer'):
+      port.reset_input_buffer()
+    else:
+      port.flushInput()
+    self.buf = ''
+
+  def detectBaud(self, bauds=BAUDS, timeout=1.5):
+    '''find the speed the receiver is sending at, leaves the port set to it;
+    returns the baud rate or None'''
+    for baud in bauds:
+      self.setSpeed(baud)
+      if self.listen(timeout):
+        return baud
+    return None
+
+  def setBaud(self, baud, timeout=2.0):
+    '''switch the receiver and the port to baud, True if sentences
+    arrive at the new speed; goes back to the old speed if not'''
+    old = self.port.baudrate
+    if baud == old: return True
+    self.send('PMTK251,{}'.format(baud))
+    time.sleep(0.1) # the receiver switches once the command is in
+    self.setSpeed(baud)
+    if self.listen(timeout):
+      return True
+    print 'PMTK251: nothing at {}, back to {}'.format(baud, old)
+    self.setSpeed(old)
+    return False
+
+  def setRate(self, hz):
+    '''fix rate 1-10 Hz, True if acknowledged'''
+    hz = min(max(hz, 1), 10)
+    if hz * EPOCHBYTES * 2 * 10 > self.port.baudrate: # GGA + RMC, 10 bits a byte
+      print 'PMTK220: {} Hz needs more than {} baud'.format(hz, self.port.baudrate)
+    ok = self.command('PMTK220,{}'.format(int(1000 / hz))) == 3
+    if ok: self.rate = hz
+    return ok
+
+  def setSentences(self, **rates):
+    '''output rate of each sentence in fixes, e.g. gga=1, gsv=5;
+    sentences not named are turned off'''
+    for k in rates:
+      if k not in SENTENCES: raise ValueError('PMTK314 has no {}'.format(k))
+    fields = [str(int(rates.get(k, 0))) for k in SENTENCES] + ['0'] * (19 - len(SENTENCES))
+    ok = self.command('PMTK314,' + ','.join(fields)) == 3
+    if ok: self.mask = dict((k, int(rates.get(k, 0))) for k in SENTENCES)
+    return ok
+
+  def configure(self, baud=None, rate=None, gsv=5):
+    '''usual setup for pyGPS: find the speed, switch to baud, set the fix
+    rate and send only GGA and RMC each fix and GSV every gsv fixes'''
+    if self.detectBaud() is None:
+      print 'PMTK: no receiver found'
+      return False
+    ok = True
+    if baud: ok = self.setBaud(baud) and ok
+    if rate: ok = self.setRate(rate) and ok
+    ok = self.setSentences(gga=1, rmc=1, gsv=gsv) and ok
+    return ok
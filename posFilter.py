@@ -0,0 +1,120 @@
+# position averaging for pyGPS
+# all filters take lat/lon in degrees plus the fix time and HDOP,
+# and return the smoothed lat/lon in degrees, in constant time per fix
+#
+#   mean    running average of the last n fixes, ring buffer + running sum
+#   exp     exponential smoothing
+#   kalman  constant velocity Kalman filter, measurement noise from HDOP
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math
+from array import array
+
+class runningMean():
+
+  def __init__(self, window=10):
+    self.window = window
+    self.lat = array('d', [0.0]) * window # ring buffers
+    self.lon = array('d', [0.0]) * window
+    self.i = 0 # next slot
+    self.n = 0 # slots filled, averages only use real fixes
+    self.slat = 0.0 # running sums
+    self.slon = 0.0
+
+  def update(self, lat, lon, t=None, hdop=None):
+    i = self.i
+    self.slat += lat - self.lat[i]
+    self.slon += lon - self.lon[i]
+    self.lat[i] = lat
+    self.lon[i] = lon
+    i += 1
+    if i == self.window:
+      i = 0
+      # resum once per lap so rounding errors can't build up
+      self.slat = math.fsum(self.lat)
+      self.slon = math.fsum(self.lon)
+    self.i = i
+    if self.n < self.window: self.n += 1
+    return (self.slat / self.n, self.slon / self.n)
+
+class expSmooth():
+
+  def __init__(self, alpha=0.2):
+    self.alpha = alpha # weight of the newest fix
+    self.lat = None
+    self.lon = None
+
+  def update(self, lat, lon, t=None, hdop=None):
+    if self.lat is None:
+      self.lat, self.lon = lat, lon
+    else:
+      a = self.alpha
+      self.lat += a * (lat - self.lat)
+      self.lon += a * (lon - self.lon)
+    return (self.lat, self.lon)
+
+class kalmanAxis():
+  # one axis of a constant velocity filter, state is position & velocity
+
+  def __init__(self, p):
+    self.p = p
+    self.v = 0.0
+    self.P00, self.P01, self.P11 = 1.0, 0.0, 1.0 # covariance, unknown start
+
+  def update(self, z, r, dt, q):
+    # predict
+    P00, P01, P11 = self.P00, self.P01, self.P11
+    self.p += self.v * dt
+    P00 += dt * (2*P01 + dt*P11) + q * dt**3 / 3
+    P01 += dt * P11 + q * dt**2 / 2
+    P11 += q * dt
+    # correct
+    s = P00 + r
+    k0 = P00 / s
+    k1 = P01 / s
+    y = z - self.p
+    self.p += k0 * y
+    self.v += k1 * y
+    self.P00 = (1 - k0) * P00
+    self.P01 = (1 - k0) * P01
+    self.P11 = P11 - k1 * P01
+    return self.p
+
+class kalmanFilter():
+
+  M_DEG = 111320.0 # meters per degree of latitude
+
+  def __init__(self, uere=5.0, accel=0.5):
+    self.uere = uere # receiver position error in meters at HDOP 1
+    self.accel = accel # expected acceleration, m/s/s
+    self.lat = None
+    self.lon = None
+    self.t = None
+
+  def update(self, lat, lon, t=None, hdop=None):
+    if self.lat is None:
+      self.lat, self.lon = kalmanAxis(lat), kalmanAxis(lon)
+      self.t = t
+      return (lat, lon)
+    dt = 1.0
+    if t is not None and self.t is not None:
+      dt = t - self.t
+      if dt < 0: dt += 86400 # midnight
+      if dt <= 0 or dt > 60: dt = 1.0
+    self.t = t
+    # noise in degrees, longitude degrees shrink with latitude
+    m_lat = self.M_DEG
+    m_lon = self.M_DEG * max(math.cos(math.radians(lat)), 0.01)
+    sd = self.uere * (hdop or 1.0)
+    q = self.accel**2
+    return (self.lat.update(lat, (sd/m_lat)**2, dt, q/m_lat**2),
+            self.lon.update(lon, (sd/m_lon)**2, dt, q/m_lon**2))
+
+def newFilter(mode='mean', window=10):
+  # position filter by name
+  if mode == 'mean': return runningMean(window)
+  if mode == 'exp': return expSmooth(2.0 / (window + 1)) # same "age" as a window
+  if mode == 'kalman': return kalmanFilter()
+  raise ValueError('unknown position filter {}'.format(mode))
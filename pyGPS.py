@@ -1,15 +1,25 @@
 # a class to support serial GPS devices
-# parses 3 NMEA sentences: RMC, GGA, GSV
+# parses NMEA sentences RMC, GGA, GSV, GSA, VTG, GLL, ZDA from GPS (GP),
+# GLONASS (GL), Galileo (GA), BeiDou (GB/BD), QZSS (GQ) and combined (GN)
+# talkers; satellites from all systems are merged into one view
 # runs as a thread
-# computes running average of the last 10 position values
+# smooths the position with a running average (default last 10 values),
+# exponential smoothing or a Kalman filter, see posFilter
 #
 # Copyright (c) 2014 William B Phelps
 #
 
-import time, serial, sys
+import time, serial, sys, calendar
 from datetime import datetime, timedelta
 import threading
 import math
+from nmeaParser import nmeaParser, checksum, nmeaSeconds, c2Float, c2Int, \
+  parseGGA, parseGSV, parseRMC, parseGSA, parseVTG, parseGLL, parseZDA
+from posFilter import newFilter
+from satTable import satTable, satView, satInfo, TALKERS, SYSTEM
+from skyTrack import skyTrack
+from gpsHub import gpsHub
+from gpsMetrics import metrics
 
 ''' NMEA Message formats
 
@@ -67,36 +77,34 @@ def tz_offset():
   else:
     return -time.timezone
 
-def c2Float(str):
-  try:
-     f = float(str)
-  except:
-     print 'c2float error {}'.format(str)
-     f = 0
-  return f
-
-def c2Int(str):
-  try:
-     i = int(str)
-  except:
-     print 'c2int error {}'.format(str)
-     i = 0
-  return i
-
 # check serial port???
 #port = serial.Serial("/dev/ttyAMA0", baudrate=9600, timeout=3.0)
 #port = serial.Serial("/dev/ttyUSB0", baudrate=4800, timeout=3.0)
 
-class satInfo():
-  def __init__(self,svn,alt,azi,snr):
-    self.svn = svn # SV PRN
-    self.alt = alt # altitude
-    self.azi = azi # azimuth
-    self.snr = snr # S/N ratio
+class gpsFix(object):
+  # one consistent, read only set of values for an epoch
+  # the reader thread swaps in a new one, consumers just take gps.fix
+  __slots__ = ('epoch', 'datetime', 'status', 'statusOK', 'latitude', 'longitude',
+    'avg_latitude', 'avg_longitude', 'quality', 'altitude', 'geodiff',
+    'hDilution', 'satellites', 'utc', 'speed', 'course', 'nsats')
+
+  def __init__(self, **kw):
+    for k in self.__slots__:
+      object.__setattr__(self, k, kw.get(k))
+
+  def __setattr__(self, name, value):
+    raise AttributeError('gpsFix is read only')
+
+  def __reduce__(self): # so a fix can be pickled to another process
+    return (_newFix, (dict((k, getattr(self, k)) for k in self.__slots__),))
+
+def _newFix(kw):
+  return gpsFix(**kw)
 
 class pyGPS():
 
-  def __init__(self,device='/dev/ttyAMA0',baudrate=9600,timeout=3.0):
+  def __init__(self,device='/dev/ttyAMA0',baudrate=9600,timeout=3.0,port=None,avgWindow=10,avgMode='mean',
+      trackInterval=60,trackLength=360):
     self.device = device
     self.baudrate = baudrate
     self.timeout = timeout
@@ -104,51 +112,238 @@ class pyGPS():
     self._run = False
     self.statusOK = False
     self.status = 'x' # 'A' or 'V'
-    self.satellites = []
+    self.satellites = satView() # last complete GSV cycle
     self.lock = threading.Lock()
     self.latitude = 0
     self.longitude = 0
     self.datetime = None
-    self.port = serial.Serial(self.device,baudrate=self.baudrate, timeout=self.timeout)
-    self.rcv = '' # buffer
-    self.i = 0 # buffer index
+    if port is None: # otherwise a replaySource or anything that reads like a port
+      port = serial.Serial(self.device,baudrate=self.baudrate, timeout=self.timeout)
+    self.port = port
+    self.handlers = {} # 'GPGGA' etc -> handler(talker, fields)
+    self.parser = nmeaParser(accept=self.handlers) # skips anything without a handler
+    self.register('GGA', self.doGGA)
+    self.register('GSV', self.doGSV)
+    self.register('RMC', self.doRMC)
+    self.register('GSA', self.doGSA)
+    self.register('VTG', self.doVTG)
+    self.register('GLL', self.doGLL)
+    self.register('ZDA', self.doZDA)
+    self.table = satTable() # updated in place by GSV
+    self.gsvCycle = 0
+    self.sysCycle = {} # system -> GSV cycle being received
+    self.gsvBusy = set() # systems part way through a GSV cycle
+    self.track = skyTrack(trackInterval, trackLength) # satellite sky tracks
     self.error = ''
     self.quality = 0
     self.altitude = 0
     self.hDilution = 0
     self.geodiff = 0
-    self.l10_lat = [0,0,0,0,0,0,0,0,0,0] # last 10 latitude values
-    self.l10_lon = [0,0,0,0,0,0,0,0,0,0]
-    self.avg_latitude = 0 # position averaging (simple)
-    self.avg_longitude = 0 # position averaging (simple)
+    self.avgFilter = newFilter(avgMode, avgWindow) # position averaging
+    self.avg_latitude = 0
+    self.avg_longitude = 0
+    self.ggaTime = None # epoch is complete when GGA and RMC times match
+    self.rmcTime = None # or GLL, until an RMC has been seen
+    self.rmcSeen = False
+    self.doneTime = None # time of the last complete epoch, published once
+    self.epochDue = False # epoch waiting for a GSV cycle to finish
+    self.utc = None # fix time, seconds since 1970 UTC
+    self.nsats = 0 # satellites used, from GGA
+    self.speed = None # knots, from RMC or VTG
+    self.course = None # degrees true
+    self.fixType = 0 # GSA 1 = none, 2 = 2D, 3 = 3D
+    self.used = [] # PRNs used in the fix
+    self.pDilution = None
+    self.vDilution = None
+    self.epoch = 0
+    self.published = None # time of the last epoch, for metrics and fix age
+    self.fix = self.snapshot() # latest complete epoch
+    self.hub = gpsHub() # fan-out to fixes(), sky(), sentences() subscribers
 
   def __exit__(self, type, value, traceback):
     self.port.close() # close serial port
     print 'GPS exit'
 
+  def register(self, kind, handler, talkers=TALKERS):
+    # handle sentence type kind ('GGA') from each talker
+    # handler is called with the talker ('GP') and the field list
+    for t in talkers:
+      self.handlers[t + kind] = handler
+
   def check(self,rcv):
-    # calculate checksum
-    chk1 = 0
-    i = 0
-    for ch in rcv:
-      if (ch == '*'):
-        break
-      chk1 = chk1 ^ ord(ch)
-      i += 1
-    chk2 = int(rcv[i+1:i+3],16)
-#    print("chk1:" + hex(chk1) + " chk2:" + hex(chk2))
-    if (chk1 != chk2):
-      print "Checksum error"
-      return False
-    else:
-      return True
+    # verify checksum of one sentence, with or without the leading $
+    return checksum(rcv, -1 if rcv[0] != '$' else 0, rcv.rfind('*'))
+
+  def snapshot(self):
+    return gpsFix(epoch=self.epoch, datetime=self.datetime, status=self.status,
+      statusOK=self.statusOK, latitude=self.latitude, longitude=self.longitude,
+      avg_latitude=self.avg_latitude, avg_longitude=self.avg_longitude,
+      quality=self.quality, altitude=self.altitude, geodiff=self.geodiff,
+      hDilution=self.hDilution, satellites=self.satellites, utc=self.utc,
+      speed=self.speed, course=self.course, nsats=self.nsats)
+
+  def publish(self):
+    # called by the reader thread when GGA and RMC for an epoch are in,
+    # waits for the end of a GSV cycle that is still coming in
+    if self.gsvBusy:
+      self.epochDue = True
+      return
+    self.epochDue = False
+    self.epoch += 1
+    now = time.time()
+    if metrics.on and self.published is not None:
+      metrics.observe('gps.epochInterval', now - self.published)
+    self.published = now
+    fix = self.snapshot()
+    self.fix = fix # single reference swap, readers don't need a lock
+    self.hub.publish('fix', fix)
+
+  def complete(self, gtime):
+    # GGA and RMC (or GLL) for gtime are both in
+    if gtime and gtime == self.doneTime: return # GLL got there first
+    self.doneTime = gtime
+    self.publish()
+
+  def newTime(self, gtime):
+    # a GGA or RMC for the next epoch: a GSV cycle still open from the
+    # last one has lost its end, so stop holding the last epoch for it
+    if gtime == self.ggaTime or gtime == self.rmcTime: return
+    if self.gsvBusy:
+      self.gsvBusy.clear()
+      if self.epochDue: self.publish()
+
+  def fixes(self, maxlen=16):
+    '''subscription to a gpsFix per epoch, iterate it or get(timeout)'''
+    return self.hub.subscribe('fix', maxlen)
+
+  def sky(self, maxlen=4):
+    '''subscription to the merged satView after each GSV cycle'''
+    return self.hub.subscribe('sky', maxlen)
+
+  def sentences(self, maxlen=256):
+    '''subscription to every NMEA sentence received, as a string'''
+    sub = self.hub.subscribe('sentence', maxlen)
+    self.parser.tap = self.tap
+    return sub
+
+  def tap(self, line):
+    if self.hub.wanted('sentence'):
+      self.hub.publish('sentence', line)
+    else: # last subscriber gone
+      self.parser.tap = None
+
+  def doGGA(self, talker, f):
+#  $GPGGA,hhmmss.ss,llll.ll,a,yyyyy.yy,a,q,ns,h.d,a.a,M,x.x,M,x.x,xxxx*hh
+    gtime, lat, lon, quality, nsats, hDilution, altitude, geodiff = parseGGA(f)
+    self.newTime(gtime)
+#    print 't: {}, q: {}, alt: {}'.format(gtime,quality, altitude)
+    self.quality = quality # 0 once the fix is lost, the rest keep their last values
+    if quality>0:
+      self.altitude = altitude
+      self.geodiff = geodiff
+      self.hDilution = hDilution
+      self.nsats = nsats
+      alat, alon = self.avgFilter.update(lat, lon, nmeaSeconds(gtime), hDilution)
+      self.avg_latitude = math.radians(alat)
+      self.avg_longitude = math.radians(alon)
+    self.ggaTime = gtime
+    if gtime == self.rmcTime: self.complete(gtime)
+
+  def doGSV(self, talker, f): # satellite info
+    nmsgs, msgn, nsats, sats = parseGSV(f)
+    sys = SYSTEM[talker]
+    if talker == 'GN' and sats and int(sats[0][0]) > 64: # GLONASS in a GN cycle
+      sys = 1
+    if (msgn == "1"):
+      self.gsvCycle += 1
+      self.sysCycle[sys] = self.gsvCycle
+      self.table.begin(sys)
+    cycle = self.sysCycle.get(sys, 0)
+    self.table.updateAll(sats, cycle, sys)
+    if (msgn != nmsgs):
+      self.gsvBusy.add(sys)
+    else: # last gsv message of this system
+      self.gsvBusy.discard(sys)
+      self.satellites = self.table.finish(cycle, sys)
+      self.hub.publish('sky', self.satellites)
+      if self.datetime is not None: # receiver time, so replays give real tracks
+        t = calendar.timegm(self.datetime.timetuple())
+      else:
+        t = time.time()
+      self.track.add(self.satellites, t)
+      if self.epochDue: self.publish()
+
+  def doRMC(self, talker, f): # required miminum
+    gtime, status, lat, lon, spd, crs, gdate = parseRMC(f)
+    self.newTime(gtime)
+    self.status = status
+    self.speed = float(spd) if spd else None
+    self.course = float(crs) if crs else None
+    if gdate: # no date until the receiver has had a fix
+      utc = datetime.strptime(gdate+gtime[:6], "%d%m%y%H%M%S")
+      self.utc = calendar.timegm(utc.timetuple()) + c2Float(gtime[6:] or 0)
+      self.datetime = utc + timedelta(seconds=tz_offset())
+#    print("status: {}, lat: {}, lon: {}, time: {}".format(self.status, lat, lon, self.datetime))
+    self.latitude = math.radians(lat)
+    self.longitude = math.radians(lon)
+    self.statusOK = (self.status == 'A')
+    self.rmcSeen = True
+    self.rmcTime = gtime
+    if gtime == self.ggaTime: self.complete(gtime)
 
-  def ntok(self):
-    i2 = self.rcv.find(',', self.i) # find next comma
-    if (i2 < 0): return ''
-    tk = self.rcv[self.i:i2]
-    self.i = i2 + 1
-    return tk
+  def doGSA(self, talker, f): # DOP and satellites used
+    self.fixType, self.used, self.pDilution, hdop, self.vDilution = parseGSA(f)
+
+  def doVTG(self, talker, f): # course and speed
+    self.course, self.speed = parseVTG(f)
+
+  def doGLL(self, talker, f): # position, stands in for RMC on receivers set up without it
+    gtime, status, lat, lon = parseGLL(f)
+    if status == 'A':
+      self.latitude = math.radians(lat)
+      self.longitude = math.radians(lon)
+    if self.rmcSeen: return
+    self.newTime(gtime)
+    self.status = status
+    self.statusOK = (status == 'A')
+    self.rmcTime = gtime
+    if gtime == self.ggaTime: self.complete(gtime)
+
+  def doZDA(self, talker, f): # date and time, all there is of them without RMC
+    gtime, day, month, year = parseZDA(f)
+    if year:
+      utc = datetime(year, month, day, int(gtime[0:2]), int(gtime[2:4]), int(gtime[4:6]))
+      self.utc = calendar.timegm(utc.timetuple()) + c2Float(gtime[6:] or 0)
+      self.datetime = utc + timedelta(seconds=tz_offset())
+
+  def feed(self, data):
+    # parse a chunk of raw data from the receiver
+    handlers = self.handlers
+    on = metrics.on # one test per chunk when metrics are off
+    if on:
+      p = self.parser
+      n, bad, t0 = p.sentences, p.badsum, time.time()
+      sentences = p.feed(data)
+      metrics.observe('nmea.frame', time.time() - t0)
+      metrics.count('nmea.sentences', p.sentences - n)
+      if p.badsum != bad: metrics.count('nmea.badsum', p.badsum - bad)
+    else:
+      sentences = self.parser.feed(data)
+    for addr, fields in sentences:
+      try:
+        if on:
+          t0 = time.time()
+          handlers[addr](addr[:2], fields)
+          kind = addr[2:]
+          metrics.observe('nmea.parse.' + kind, time.time() - t0)
+          metrics.count('nmea.parsed.' + kind)
+        else:
+          handlers[addr](addr[:2], fields)
+      except:
+        print addr, ','.join(fields)
+        print ("Error: "),sys.exc_info()[0]
+        self.error = format(sys.exc_info()[0])
+        raise
 
   def getGPS(self):
     print 'GPS start'
@@ -157,125 +352,28 @@ class pyGPS():
         print "GPS: error already running"
         return
       self.running = True
-    sats = []
+    port = self.port
     while self._run:
-      self.rcv = self.port.readline()
-      try:
-
-#  $GPGGA,hhmmss.ss,llll.ll,a,yyyyy.yy,a,q,ns,h.d,a.a,M,x.x,M,x.x,xxxx*hh
-        if (self.rcv[:7] == '$GPGGA,'):
-          self.rcv = self.rcv[1:] # remove $
-#          print("rcv:" + repr(self.rcv))
-          if self.check(self.rcv): # check checksum
-            self.i = 6 # start at 1st token
-            gtime = self.ntok()[:6]
-            lat = c2Float(self.ntok())
-            lat = lat//100 + (lat%100)/60.0
-            latD = self.ntok()
-            if latD == 'S': lat = -lat
-            lon = c2Float(self.ntok())
-            lon = lon//100 + (lon%100)/60.0
-            lonD = self.ntok()
-            if lonD == 'W': lon = -lon
-            quality = c2Int(self.ntok())
-            nsats = c2Int(self.ntok())
-            hDilution = c2Float(self.ntok())
-            altitude = c2Float(self.ntok())
-            altu = self.ntok()
-            geodiff = c2Float(self.ntok())
-            gdiffu = self.ntok()
-#            print 't: {}, q: {}, alt: {}'.format(gtime,quality, alt)
-            if quality>0:
-#              print 'alt:{}'.format(alt)
-              with self.lock:
-                self.quality = quality
-                self.altitude = altitude
-                self.geodiff = geodiff
-                self.hDilution = hDilution
-                self.l10_lat.append(lat)
-                self.l10_lat = self.l10_lat[1:]
-                self.l10_lon.append(lon)
-                self.l10_lon = self.l10_lon[1:]
-                self.avg_latitude = math.radians(sum(self.l10_lat)/10.0)
-                self.avg_longitude = math.radians(sum(self.l10_lon)/10.0)
-#              if gtime == '':
-#                print("quality: {}, lat: {}{}, lon: {}{}, time: {}".format(quality,  latD, lat, lonD, lon, 0))
-#              else:
-#                print 'gtime: "{}"'.format(gtime)
-#                t = datetime.strptime(gtime, "%H%M%S")
-#                print("quality: {}, lat: {}{}, lon: {}{}, alt {}{}, gdiff {}{}, time: {}".format(quality,  latD, lat,
-#                  lonD, lon, alt, altu, gdiff, gdiffu, t))
-
-        if (self.rcv[:7] == '$GPGSV,'): # satellite info
-          self.rcv = self.rcv[1:] # remove $
-#          print("rcv:" + repr(self.rcv))
-          if self.check(self.rcv):
-            self.i = 6 # start at 1st token
-            nmsgs = self.ntok()
-            msgn = self.ntok()
-            nsats = self.ntok()
-            if (msgn == "1"):
-              sats = []
-            while True:
-              svn = self.ntok()
-              if (not svn.isdigit()):
-                break;
-#              print 'i: {}, svn: {}'.format(self.i,svn)
-              alt, azi, snr = 0,0,0
-              talt = self.ntok()
-              if talt.isdigit(): alt = int(talt)
-              tazi = self.ntok()
-              if tazi.isdigit(): azi = int(tazi)
-              tsnr = self.ntok()
-              if tsnr.isdigit(): snr = int(tsnr)
-              sats.append(satInfo(svn,math.radians(alt),math.radians(azi),snr))
-            if (msgn == nmsgs): # last gpgsv message?
-              with self.lock:
-                self.satellites = sats
-#              s1 = ""
-#              ns = 0
-#              for sat in sats:
-#                if (sat.snr>0):
-#                  ns += 1
-#                  s1 = s1 + "{}:{},{},{}, ".format(sat.svn,math.degrees(sat.alt),math.degrees(sat.azi),sat.snr)
-#              print('{:0>2}/{:2} sats {!s}'.format(ns, nsats, s1))
-
-        if (self.rcv[:7] == '$GPRMC,'): # required miminum 
-          self.rcv = self.rcv[1:] # remove $
-#          print("rcv:" + repr(self.rcv))
-          if self.check(self.rcv): # check checksum
-            self.i = 6 # start at 1st token
-            gtime = self.ntok()[:6]
-            self.status = self.ntok()
-#            print ("status: " + self.status)
-            lat = c2Float(self.ntok())
-            lat = lat//100 + (lat%100)/60.0
-            latD = self.ntok()
-            if latD == 'S': lat = -lat
-            lon = c2Float(self.ntok())
-            lon = lon//100 + (lon%100)/60.0
-            lonD = self.ntok()
-            if lonD == 'W': lon = -lon
-            spd = self.ntok()
-            crs = self.ntok()
-            gdate = self.ntok()
-            mag = self.ntok()
-            dt = datetime.strptime(gdate+gtime, "%d%m%y%H%M%S") + timedelta(seconds=tz_offset())
-#            print("status: {}, lat: {}, lon: {}, time: {}".format(self.status, lat, lon, dt))
-            with self.lock:
-              self.statusOK = False
-              self.latitude = math.radians(lat)
-              self.longitude = math.radians(lon)
-              self.datetime = dt
-              if self.status == 'A':
-                self.statusOK = True
-      except:
-        print self.rcv
-        print ("Error: "),sys.exc_info()[0]
-        self.error = format(sys.exc_info()[0])
-        raise
+      # take whatever has arrived, or block for the next byte
+      if metrics.on: # time spent waiting on the port
+        t0 = time.time()
+        data = port.read(port.inWaiting() or 1)
+        metrics.observe('serial.read', time.time() - t0)
+        metrics.count('serial.bytes', len(data))
+        self.feed(data)
+      else:
+        self.feed(port.read(port.inWaiting() or 1))
     print 'GPS stop'  
 
+  def configure(self, baudrate=None, rate=None, gsv=5):
+    '''set up an MTK receiver before start(): find its speed and switch
+    to baudrate, set the fix rate in Hz and cut the sentences to GGA and
+    RMC every fix and GSV every gsv fixes; see pmtkConfig'''
+    from pmtkConfig import pmtkConfig
+    ok = pmtkConfig(self.port).configure(baudrate, rate, gsv)
+    self.baudrate = self.port.baudrate
+    return ok
+
   def start(self):
     with self.lock:
       if self.running == False:
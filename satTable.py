@@ -0,0 +1,109 @@
+# satellite table for pyGPS
+# one preallocated slot per (system, PRN) with typed arrays for elevation,
+# azimuth, SNR and the GSV cycle the satellite was last seen in; GSV
+# sentences write into the slots in place, and whenever a system finishes
+# a GSV cycle the latest cycle of every system is published as one
+# compact, read only satView
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+from array import array
+
+MAXPRN = 256 # PRNs 1-255 per system
+SYSTEMS = ('GPS', 'GLONASS', 'Galileo', 'BeiDou', 'QZSS')
+LETTERS = ('', 'R', 'E', 'C', 'J') # label prefix, GPS PRNs are shown bare
+STALE = 20 # cycles of other systems before a silent system is dropped
+TALKERS = ('GP', 'GL', 'GA', 'GB', 'BD', 'GQ', 'GN')
+SYSTEM = {'GP': 0, 'GN': 0, 'GL': 1, 'GA': 2, 'GB': 3, 'BD': 3, 'GQ': 4} # talker -> SYSTEMS index
+
+def label(sys, prn):
+  # name shown for a satellite, NMEA numbers GLONASS slot 1 as 65 but it is R01
+  if sys == 1 and prn > 64: prn -= 64
+  return '{}{:02d}'.format(LETTERS[sys], prn)
+
+class satInfo(object):
+  __slots__ = ('svn', 'alt', 'azi', 'snr', 'sys')
+  def __init__(self,svn,alt,azi,snr,sys=0):
+    self.svn = svn # SV PRN
+    self.alt = alt # altitude
+    self.azi = azi # azimuth
+    self.snr = snr # S/N ratio
+    self.sys = sys # index into SYSTEMS
+
+class satView(object):
+  # the satellites in view for the latest GSV cycle of each system
+  # sys, prn, alt, azi, snr are parallel arrays (alt/azi in radians), ready
+  # for numpy.frombuffer; iterating gives satInfo objects as before
+  __slots__ = ('sys', 'prn', 'alt', 'azi', 'snr', 'cycle', '_sats')
+
+  def __init__(self, sys=None, prn=None, alt=None, azi=None, snr=None, cycle=0):
+    self.sys = sys if sys is not None else array('B')
+    self.prn = prn if prn is not None else array('H')
+    self.alt = alt if alt is not None else array('f')
+    self.azi = azi if azi is not None else array('f')
+    self.snr = snr if snr is not None else array('B')
+    self.cycle = cycle
+    self._sats = None
+
+  def __len__(self):
+    return len(self.prn)
+
+  def keys(self):
+    # (system, PRN) packed in one number, unique across systems
+    return [s * MAXPRN + p for s, p in zip(self.sys, self.prn)]
+
+  def __iter__(self):
+    if self._sats is None: # only built for code that wants objects
+      self._sats = [satInfo(label(y, p), a, z, s, y)
+        for y, p, a, z, s in zip(self.sys, self.prn, self.alt, self.azi, self.snr)]
+    return iter(self._sats)
+
+class satTable():
+
+  def __init__(self, nsys=len(SYSTEMS)):
+    self.nsys = nsys
+    size = nsys * MAXPRN # slot = system * MAXPRN + PRN
+    self.alt = array('f', [0]) * size # radians
+    self.azi = array('f', [0]) * size
+    self.snr = array('B', [0]) * size # dB
+    self.seen = array('L', [0]) * size # GSV cycle last seen in, 0 = never
+    self.current = [array('H') for s in range(nsys)] # slots in the cycle being received
+    self.done = [array('H') for s in range(nsys)] # slots of the last complete cycle
+    self.doneAt = [0] * nsys # finish count when each system last completed
+    self.finishes = 0
+
+  def begin(self, sys=0):
+    # start of a GSV cycle, forget a cycle that never finished
+    del self.current[sys][:]
+
+  def updateAll(self, sats, cycle, sys=0):
+    # update from a list of (svn, alt, azi, snr) as returned by parseGSV
+    base = sys * MAXPRN
+    seen, current = self.seen, self.current[sys]
+    alt, azi, snr = self.alt, self.azi, self.snr
+    for s in sats:
+      prn = int(s[0])
+      if 0 < prn < MAXPRN:
+        slot = base + prn
+        if seen[slot] != cycle:
+          current.append(slot)
+        alt[slot], azi[slot], snr[slot] = s[1], s[2], s[3]
+        seen[slot] = cycle
+
+  def finish(self, cycle, sys=0):
+    '''end of a GSV cycle for sys, returns a satView of all systems'''
+    seen = self.seen
+    self.done[sys] = array('H', [p for p in self.current[sys] if seen[p] == cycle])
+    del self.current[sys][:]
+    self.finishes += 1
+    self.doneAt[sys] = self.finishes
+    slots = array('H')
+    for s in range(self.nsys):
+      if self.finishes - self.doneAt[s] > STALE: # system no longer reported
+        del self.done[s][:]
+      slots.extend(self.done[s])
+    return satView(array('B', [p // MAXPRN for p in slots]),
+      array('H', [p % MAXPRN for p in slots]),
+      array('f', map(self.alt.__getitem__, slots)), array('f', map(self.azi.__getitem__, slots)),
+      array('B', map(self.snr.__getitem__, slots)), cycle)
@@ -1,10 +1,15 @@
 # show GPS data on PiTFT Screen
 
-from datetime import datetime, timedelta
+import time
 import pygame
 from pygame.locals import *
 import math
-from plotSky import plotStars, plotPlanets
+import numpy as np
+from skyLayers import skyLayers
+from skyProjection import getxy, project
+from spriteAtlas import spriteAtlas, blits
+from fontCache import getFont, render
+from gpsMetrics import metrics
 
 Red = pygame.Color('red')
 Orange = pygame.Color('orange')
@@ -15,153 +20,218 @@ Cyan = pygame.Color('cyan')
 Magenta = pygame.Color('magenta')
 White = pygame.Color('white')
 Black = (0,0,0)
-R90 = math.radians(90) # 90 degrees in radians
 
-centerX = 160 # center of sky circle
-centerY = 120
-diameter = 120
-
-def getxy(alt, azi): # alt, az in radians
-# thanks to John at Wobbleworks for the algorithm
-    r = (R90 - alt)/R90
-    x = r * math.sin(azi)
-    y = r * math.cos(azi)
-#    x = int(centerX - x * diameter) # flip E/W, scale to radius, center on plot
-    x = int(centerX + x * diameter) # scale to radius, center on plot
-    y = int(centerY - y * diameter) # scale to radius, center on plot
-    return (x,y)
-
-def getxyD(alt, azi): # alt, az in degrees
-    return getxy(math.radians(alt), math.radians(azi))
+trailColor = (96,96,96) # satellite sky tracks
+satRed, satYellow, satGreen = tuple(Red), tuple(Yellow), tuple(Green) # SNR, as sprite keys
+
+def lineRect(a, b):
+  # area a 1 pixel line from a to b can touch
+  return pygame.Rect(min(a[0], b[0]), min(a[1], b[1]),
+    abs(a[0] - b[0]) + 1, abs(a[1] - b[1]) + 1).inflate(2, 2)
+
+def mergeRects(rects):
+  # combine overlapping rectangles so no area is drawn twice
+  out = []
+  for r in rects:
+    r = pygame.Rect(r)
+    i = r.collidelist(out)
+    while i >= 0:
+      r.union_ip(out.pop(i))
+      i = r.collidelist(out)
+    out.append(r)
+  return out
 
 class showGPS():
 
-  def __init__(self, screen, gps, obs, sun, x=0, y=0):
+  def __init__(self, screen, gps, obs, sun, x=0, y=0, dirtyRects=True, display=None):
 
     self.screen = screen
+    self.display = display or pygame.display # anything with update(rects)
     self.pos = (x,y)
+    self.dirtyRects = dirtyRects # only send changed areas to the display
+    self.drawn = None # key -> (state, rect) of what is on screen
+    self.items = []
 
     self.window = screen.copy() 
-    self.BG = screen.copy() # make another copy for the background
-    self.BGupdate = datetime.now() - timedelta(seconds=61) # force BG update
-
-    self.drawBG(obs, sun)
+    self.sprites = spriteAtlas(getFont("Arial", 10, bold=True), self.window) # satellite markers
+    self.layers = skyLayers(screen) # stars, planets etc. cached in layers
+    self.BG = self.layers.BG # the sky chart
+    self.bgColor = (0,0,0)
+    self.base = screen.copy() # background with satellite tracks drawn on it
+    self.trackVersion = -1 # last skyTrack state drawn on base
+    self.trackWraps = -1
 
   def drawBG(self, obs, sun):
-
-    self.BGupdate = datetime.now()
-
-    self.BG.fill((0,0,0)) # clear window
-
-    sunaltd = math.degrees(sun.alt)
-#    print "sun alt {}".format(sunaltd)
-    if (sunaltd > 0):
-        self.bgColor = (32,32,92) # daytime
-    elif (sunaltd > -15): # twilight ???
-        self.bgColor = (16,16,64)
+    # refresh the sky layers that are out of date, see skyLayers.update
+    changed = self.layers.update(obs, sun)
+    self.bgColor = self.layers.bgColor
+    return changed
+
+  def redrawBase(self, rects, track):
+    # chart and tracks again in rects of base, after planets moved or
+    # the oldest points of full tracks went; track segments that touch
+    # the rects are drawn whole, a clipped line can land on other pixels
+    for r in rects:
+      self.base.blit(self.BG, r, r)
+    if track is None or not rects: return
+    tracks = [t for t in track.arrays().values() if len(t[0]) > 1]
+    if not tracks: return
+    # every track in one pass, segments x rects
+    xs, ys = project(np.concatenate([a for a, z in tracks]), np.concatenate([z for a, z in tracks]))
+    x0, x1 = np.minimum(xs[:-1], xs[1:]), np.maximum(xs[:-1], xs[1:])
+    y0, y1 = np.minimum(ys[:-1], ys[1:]), np.maximum(ys[:-1], ys[1:])
+    r = np.array([(q.left, q.top, q.right, q.bottom) for q in rects])
+    hit = ((x0[:,None] < r[:,2]) & (x1[:,None] >= r[:,0]) &
+      (y0[:,None] < r[:,3]) & (y1[:,None] >= r[:,1])).any(1)
+    hit[np.cumsum([len(a) for a, z in tracks])[:-1] - 1] = False # one track's end to the next's start
+    xs, ys = xs.tolist(), ys.tolist()
+    line = pygame.draw.line
+    for i in np.flatnonzero(hit).tolist():
+      line(self.base, trailColor, (xs[i], ys[i]), (xs[i+1], ys[i+1]), 1)
+
+  def text(self, key, font, s, color, pos, right=False, bg=None):
+    # add a text item at pos, or with its right edge at pos[0]
+    surf = render(font, s, color, bg)
+    rect = surf.get_rect()
+    if right:
+      rect.topright = pos
     else:
-        self.bgColor = (0,0,0)
-
-    pygame.draw.circle(self.BG, self.bgColor, (centerX,centerY), diameter, 0)
-    pygame.draw.circle(self.BG, (0,255,255), (centerX,centerY), diameter, 1)
-
-    txtColor = Cyan
-    txtFont = pygame.font.SysFont("Arial", 14, bold=True)
-    txt = txtFont.render("N" , 1, txtColor)
-    rect = txt.get_rect()
-    rect.centerx, rect.centery = getxyD(7,0)
-    self.BG.blit(txt, rect)
-    txt = txtFont.render("S" , 1, txtColor)
-    rect = txt.get_rect()
-    rect.centerx, rect.centery = getxyD(6,180)
-    self.BG.blit(txt, rect)
-    txt = txtFont.render("E" , 1, txtColor)
-    rect = txt.get_rect()
-    rect.centerx, rect.centery = getxyD(6,90)
-    self.BG.blit(txt, rect)
-    txt = txtFont.render("W" , 1, txtColor)
-    rect = txt.get_rect()
-    rect.centerx, rect.centery = getxyD(7,270)
-    self.BG.blit(txt, rect)
-
-    plotStars(self.BG, obs, sun)
-    plotPlanets(self.BG, obs, sun)
-
+      rect.topleft = pos
+    self.items.append((key, (s, tuple(color)), rect, (surf, rect)))
+
+  def drawTracks(self, track, full):
+    '''bring the satellite tracks on base up to date, extending them
+    with the newest points and erasing the oldest where possible;
+    returns the rectangles that changed, or None if base was redrawn'''
+    version, wraps, segs, gone = track.since(self.trackVersion, self.trackWraps)
+    if not full and (version, wraps) == (self.trackVersion, self.trackWraps):
+      return []
+    self.trackVersion, self.trackWraps = version, wraps
+    if full or segs is None:
+      self.base.blit(self.BG, (0,0))
+      for pts in track.tracks().values():
+        if len(pts) > 1:
+          pygame.draw.lines(self.base, trailColor, False, [getxy(a, z) for a, z in pts], 1)
+      return None
+    rects = []
+    if gone:
+      rects = mergeRects([lineRect(getxy(*a), getxy(*b)) for prn, a, b in gone])
+      self.redrawBase(rects, track)
+    for prn, a, b in segs:
+      if a is not None: # first point of a track has nothing to join
+        rects.append(pygame.draw.line(self.base, trailColor, getxy(*a), getxy(*b), 1))
+    return rects
 
   def plot(self, gps, obs, sun):
 
-    if (datetime.now() - self.BGupdate).total_seconds() > 60:
-      self.drawBG(obs, sun) # update background image once a minute
+    fix = gps.fix # one consistent epoch for the whole frame
+    on = metrics.on
+    if on: t0 = time.time()
+
+    full = not self.dirtyRects or self.drawn is None
+    if on: t1 = time.time()
+    bgRects = self.drawBG(obs, sun) # only the layers that changed
+    if on: metrics.observe('render.drawBG', time.time() - t1)
+    newBG = bgRects is None
+    if newBG: full = True
+
+    track = getattr(gps, 'track', None)
+    if track is not None:
+      changed = self.drawTracks(track, newBG or self.trackVersion < 0)
+      if changed is None: full = True
+    else:
+      if newBG: self.base.blit(self.BG, (0,0))
+      changed = []
+    if bgRects and changed is not None: # planets moved
+      self.redrawBase(bgRects, track)
+      changed = changed + bgRects
 
-    self.window.blit(self.BG,(0,0)) # paint background image
+    self.items = [] # (key, state, rect, what) in drawing order
 
     txtColor = Yellow
-    txtFont = pygame.font.SysFont("Arial", 20, bold=True)
+    txtFont = getFont("Arial", 20, bold=True)
 
-    t1 = txtFont.render(gps.datetime.strftime('%H:%M:%S'), 1, txtColor) # time
-    self.window.blit(t1, (0,0)) # time
+    if fix.datetime is not None: # no time until the receiver has a date
+      self.text('time', txtFont, fix.datetime.strftime('%H:%M:%S'), txtColor, (0,0))
+      self.text('year', txtFont, fix.datetime.strftime('%Y'), txtColor, (320,0), True)
+      self.text('date', txtFont, fix.datetime.strftime('%m/%d'), txtColor, (320,24), True)
 
-    t2 = txtFont.render(gps.datetime.strftime('%Y'), 1, txtColor) # date
-    rect = t2.get_rect()
-    self.window.blit(t2, (320 - rect.width, 0))
-    t3 = txtFont.render(gps.datetime.strftime('%m/%d'), 1, txtColor) # date
-    rect = t3.get_rect()
-    self.window.blit(t3, (320 - rect.width, 24))
+    txtFont = getFont("Arial", 18, bold=True)
 
-    txtFont = pygame.font.SysFont("Arial", 18, bold=True)
-
-    alt = gps.altitude #+ gps.geodiff
+    alt = fix.altitude #+ fix.geodiff
     if alt<100:
       talt = '{:6.1f}m'.format(alt)
     else:
       talt = '{:6.0f}m'.format(alt)
-    talt = txtFont.render(talt, 1, txtColor)
-    rect = talt.get_rect()
-    self.window.blit(talt, (320 - rect.width, 180))
+    self.text('alt', txtFont, talt, txtColor, (320,180), True)
 
-    if gps.quality == 2:
+    if fix.quality == 2:
       fmt = '{:7.5f}' # differential GPS - 1 meter accuracy!!!
     else:
       fmt = '{:7.5f}' # normal signal
 
-    tlat = txtFont.render(fmt.format(math.degrees(gps.avg_latitude)), 1, txtColor)
-    rect = tlat.get_rect()
-    self.window.blit(tlat, (320 - rect.width, 200))
-
-    tlon = txtFont.render(fmt.format(math.degrees(gps.avg_longitude)), 1, txtColor)
-    rect = tlon.get_rect()
-    self.window.blit(tlon, (320 - rect.width, 220))
-
-    satFont = pygame.font.SysFont("Arial", 10, bold=True)
+    self.text('lat', txtFont, fmt.format(math.degrees(fix.avg_latitude)), txtColor, (320,200), True)
+    self.text('lon', txtFont, fmt.format(math.degrees(fix.avg_longitude)), txtColor, (320,220), True)
 
 # TODO: detect collision and move label ?
-    ns = 0
+    view = fix.satellites
+    xs, ys = project(view.alt, view.azi) # all satellites in one go
+    ns = len(view)
     nsa = 0
-    for sat in gps.satellites: # plot all GPS satellites on sky chart
-        if (sat.alt,sat.azi) == (0,0): pass
-        xy = getxy(sat.alt,sat.azi)
-        ns += 1
-        sz = sat.snr
+    bg = self.bgColor
+    sprite = self.sprites.get
+    for x, y, sz, sys, prn in zip(xs.tolist(), ys.tolist(), view.snr, view.sys, view.prn):
         if sz>0: nsa += 1
-        if sz<5:    color = Red # no signal
-        elif sz<20: color = Yellow
-        else:       color = Green
+        if sz<5:    color = satRed # no signal
+        elif sz<20: color = satYellow
+        else:       color = satGreen
         if sz<9: sz = 9 # minimum circle size
-        pygame.draw.circle(self.window, color, xy, sz, 1)
-        t1 = satFont.render(format(sat.svn), 1, White, self.bgColor)
-        t1pos = t1.get_rect()
-        t1pos.centerx = xy[0]
-        t1pos.centery = xy[1]
-        self.window.blit(t1,t1pos)
-
-    s1 = txtFont.render('{}/{}'.format(gps.status,gps.quality), 1, txtColor)
-    self.window.blit(s1,(1,24))
-    s2 = txtFont.render('{:0>2}/{:0>2}'.format(nsa, ns), 1, txtColor)
-    self.window.blit(s2,(1,44))
-
-    tdil = txtFont.render('{:0.1f}m'.format(gps.hDilution), 1, txtColor)
-    self.window.blit(tdil, (1, 64))
-
-    self.screen.blit(self.window,self.pos)
-    pygame.display.update() #flip()
-
+        surf, (cx, cy) = sprite(sz, color, sys, prn, bg)
+        pos = (x - cx, y - cy)
+        self.items.append((('sat', sys, prn), ((x, y), sz, color, bg),
+          pygame.Rect(pos, surf.get_size()), (surf, pos)))
+
+    self.text('status', txtFont, '{}/{}'.format(fix.status,fix.quality), txtColor, (1,24))
+    self.text('sats', txtFont, '{:0>2}/{:0>2}'.format(nsa, ns), txtColor, (1,44))
+    self.text('hdop', txtFont, '{:0.1f}m'.format(fix.hDilution), txtColor, (1,64))
+
+    drawn = dict((item[0], item[1:3]) for item in self.items)
+
+    if full:
+      self.window.blit(self.base,(0,0)) # paint background image
+      blits(self.window, [item[3] for item in self.items])
+      self.screen.blit(self.window,self.pos)
+      if on: t1 = time.time()
+      self.display.update() #flip()
+      if on: metrics.observe('render.update', time.time() - t1)
+    else:
+      # only the areas of items that changed, appeared or went away
+      dirty = list(changed) # new track segments
+      old = self.drawn
+      for key, (state, rect) in drawn.items():
+        prev = old.pop(key, None)
+        if prev is None or prev[0] != state:
+          dirty.append(rect)
+          if prev is not None and prev[1] != rect: dirty.append(prev[1])
+      for state, rect in old.values(): # gone
+        dirty.append(rect)
+      dirty = mergeRects(dirty)
+      for r in dirty:
+        self.window.set_clip(r)
+        self.window.blit(self.base, r, r)
+        blits(self.window, [item[3] for item in self.items if item[2].colliderect(r)]) # everything that overlaps
+      self.window.set_clip(None)
+      update = []
+      for r in dirty:
+        r2 = r.move(self.pos)
+        self.screen.blit(self.window, r2, r)
+        update.append(r2)
+      if update:
+        if on: t1 = time.time()
+        self.display.update(update)
+        if on: metrics.observe('render.update', time.time() - t1)
+
+    self.drawn = drawn
+    if on:
+      metrics.observe('render.plot', time.time() - t0)
+      metrics.count('render.frames')
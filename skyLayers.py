@@ -0,0 +1,124 @@
+# layered sky chart background
+# the chart behind the GPS data is built from cached layers, each redrawn
+# only when its own inputs change:
+#
+#   frame     sky disc, horizon and N/S/E/W, one surface per sky colour;
+#             the colour changes when the Sun crosses the twilight limits
+#   stars     redrawn when the sky has turned starStep (sidereal time) or
+#             the observer has moved more than moveLimit
+#   planets   Sun, Moon and planets, checked every planetCheck seconds;
+#             only the areas of bodies that moved are recomposited
+#
+# frame + stars are kept combined as one surface, so the finished chart is
+# a single copy and one keyed blit of the planets
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math
+import pygame
+from plotSky import plotStars, plotPlanets
+from skyProjection import getxyD, centerX, centerY, diameter
+from fontCache import getFont, render
+
+KEY = (255,0,255) # transparent colour of the star and planet layers
+SIDEREAL = 2 * math.pi * 1.00273790935 # sky rotation per day, radians
+
+def skyColor(sun):
+  # background of the sky disc for the Sun's altitude
+  sunaltd = math.degrees(sun.alt)
+  if (sunaltd > 0):
+    return (32,32,92) # daytime
+  elif (sunaltd > -15): # twilight ???
+    return (16,16,64)
+  return (0,0,0)
+
+class skyLayers():
+
+  def __init__(self, screen, starStep=0.5, moveLimit=0.1, planetCheck=10.0):
+    self.screen = screen # surface the layers are made like
+    self.starStep = math.radians(starStep) # sky rotation before stars are redrawn
+    self.moveLimit = math.radians(moveLimit) # observer movement before stars are redrawn
+    self.planetCheck = planetCheck / 86400.0 # days between planet updates
+    self.frames = {} # sky colour -> frame layer
+    self.sky = screen.copy() # frame + stars
+    self.stars = self.layer()
+    self.planets = self.layer()
+    self.spare = self.layer() # planets are drawn here then swapped in if anything moved
+    self.BG = screen.copy() # the finished chart
+    self.bgColor = None
+    self.starAt = None # (date, lat, lon) the stars were drawn for
+    self.planetAt = None # (date, lat, lon) the planets were checked at
+    self.drawn = None # what plotPlanets drew last
+    self.rects = [] # and where
+    self.redraws = {'frame': 0, 'stars': 0, 'planets': 0}
+
+  def layer(self):
+    surf = self.screen.copy()
+    surf.set_colorkey(KEY)
+    surf.fill(KEY)
+    return surf
+
+  def frame(self, color):
+    # sky disc and compass points, drawn once per colour
+    surf = self.frames.get(color)
+    if surf is None:
+      self.redraws['frame'] += 1
+      surf = self.frames[color] = self.screen.copy()
+      surf.fill((0,0,0))
+      pygame.draw.circle(surf, color, (centerX,centerY), diameter, 0)
+      pygame.draw.circle(surf, (0,255,255), (centerX,centerY), diameter, 1)
+      txtFont = getFont("Arial", 14, bold=True)
+      for s, alt, azi in (("N", 7, 0), ("S", 6, 180), ("E", 6, 90), ("W", 7, 270)):
+        txt = render(txtFont, s, (0,255,255))
+        rect = txt.get_rect()
+        rect.center = getxyD(alt, azi)
+        surf.blit(txt, rect)
+    return surf
+
+  def moved(self, at, obs, step):
+    # has the sky turned more than step since at, or the observer moved
+    if at is None: return True
+    date, lat, lon = at
+    return (abs(float(obs.date) - date) * SIDEREAL >= step or
+      abs(float(obs.lat) - lat) > self.moveLimit or abs(float(obs.lon) - lon) > self.moveLimit)
+
+  def update(self, obs, sun):
+    '''bring BG up to date, returns [] if nothing changed, the changed
+    rectangles if only planets moved, or None if the whole chart changed'''
+    here = (float(obs.date), float(obs.lat), float(obs.lon))
+    color = skyColor(sun)
+    full = False
+    if self.moved(self.starAt, obs, self.starStep):
+      self.redraws['stars'] += 1
+      self.starAt = here
+      self.stars.fill(KEY)
+      plotStars(self.stars, obs, sun)
+      full = True
+    if full or color != self.bgColor:
+      self.bgColor = color
+      self.sky.blit(self.frame(color), (0,0))
+      self.sky.blit(self.stars, (0,0))
+      full = True
+
+    rects = []
+    if full or self.planetAt is None or float(obs.date) - self.planetAt[0] >= self.planetCheck or \
+        self.moved(self.planetAt, obs, self.starStep):
+      self.planetAt = here
+      spare = self.spare
+      spare.fill(KEY)
+      p = plotPlanets(spare, obs, sun)
+      if p.drawn != self.drawn:
+        self.redraws['planets'] += 1
+        rects = self.rects + p.rects # old and new positions
+        self.drawn, self.rects = p.drawn, p.rects
+        self.spare, self.planets = self.planets, spare
+
+    if full:
+      self.BG.blit(self.sky, (0,0))
+      self.BG.blit(self.planets, (0,0))
+      return None
+    for r in rects:
+      self.BG.blit(self.sky, r, r)
+      self.BG.blit(self.planets, r, r)
+    return rects
@@ -0,0 +1,43 @@
+# sky chart projection, shared by everything drawn on the chart
+# altitude/azimuth to screen x, y: zenith at the centre, the horizon on a
+# circle of radius diameter, north up and east to the right
+# getxy does one point, project() does whole NumPy arrays in one pass
+# with the same arithmetic, so both land on the same pixels
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math
+import numpy as np
+
+R90 = math.radians(90) # 90 degrees in radians
+
+centerX = 160 # center of sky circle
+centerY = 120
+diameter = 120
+
+def getxy(alt, azi): # alt, az in radians
+# thanks to John at Wobbleworks for the algorithm
+    r = (R90 - alt)/R90
+    x = r * math.sin(azi)
+    y = r * math.cos(azi)
+#    x = int(centerX - x * diameter) # flip E/W, scale to radius, center on plot
+    x = int(centerX + x * diameter) # scale to radius, center on plot
+    y = int(centerY - y * diameter) # scale to radius, center on plot
+    return (x,y)
+
+def getxyD(alt, azi): # alt, az in degrees
+    return getxy(math.radians(alt), math.radians(azi))
+
+def project(alt, azi):
+  '''x, y int arrays for arrays (or buffers of float32) of alt, azi in radians'''
+  if not isinstance(alt, np.ndarray):
+    if not len(alt):
+      return np.zeros(0, np.int32), np.zeros(0, np.int32)
+    alt = np.frombuffer(alt, np.float32)
+    azi = np.frombuffer(azi, np.float32)
+  r = (R90 - alt.astype(np.float64)) / R90
+  azi = azi.astype(np.float64)
+  x = (centerX + r * np.sin(azi) * diameter).astype(np.int32)
+  y = (centerY - r * np.cos(azi) * diameter).astype(np.int32)
+  return x, y
@@ -0,0 +1,123 @@
+# satellite sky tracks for pyGPS
+# keeps a trail of positions per PRN in fixed size rings inside
+# preallocated arrays, one point per "interval" seconds, so memory use is
+# set when the object is made and never grows however long it runs
+# when all tracks are in use the one seen least recently is reused
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math, threading
+import numpy as np
+from array import array
+from collections import deque
+
+class skyTrack():
+
+  def __init__(self, interval=60, length=360, maxSats=64):
+    self.interval = interval # seconds between points of a track
+    self.length = length # points per track, 360 at 60s = 6 hours
+    self.maxSats = maxSats
+    n = maxSats * length
+    self.alt = array('h', [0]) * n # centidegrees
+    self.azi = array('H', [0]) * n
+    self.prn = array('H', [0]) * maxSats # PRN of each track, 0 = free
+    self.head = array('H', [0]) * maxSats # next point to write
+    self.count = array('H', [0]) * maxSats
+    self.last = array('d', [0]) * maxSats # time of newest point
+    self.slots = {} # PRN -> track
+    self.version = 0 # bumped for every point added
+    self.wraps = 0 # bumped when a track is dropped or reused
+    self.log = deque(maxlen=maxSats) # (version, prn, from, to, gone) of recent points
+    self.lock = threading.Lock()
+
+  def allocate(self, prn):
+    # a free track, or the one seen least recently
+    try:
+      slot = list(self.prn).index(0)
+    except ValueError:
+      slot = min(range(self.maxSats), key=self.last.__getitem__)
+      del self.slots[self.prn[slot]]
+      self.wraps += 1
+    self.prn[slot] = prn
+    self.head[slot] = 0
+    self.count[slot] = 0
+    self.slots[prn] = slot
+    return slot
+
+  def add(self, view, t):
+    '''add the satellites of a satView seen at time t (seconds),
+    tracks are keyed by satView.keys() so systems don't collide'''
+    with self.lock:
+      for prn, alt, azi in zip(view.keys(), view.alt, view.azi):
+        if alt == 0 and azi == 0: continue # not tracked yet
+        slot = self.slots.get(prn)
+        if slot is None:
+          slot = self.allocate(prn)
+        elif 0 <= t - self.last[slot] < self.interval:
+          continue
+        self.point(slot, int(round(math.degrees(alt) * 100)), int(round(math.degrees(azi) * 100)) % 36000, t)
+
+  def point(self, slot, alt, azi, t):
+    length = self.length
+    base = slot * length
+    h = self.head[slot]
+    prev = gone = None
+    if self.count[slot]:
+      p = base + (h - 1) % length
+      prev = (self.alt[p], self.azi[p])
+    if self.count[slot] == length: # oldest point goes, and the segment from it
+      if length > 1:
+        q = base + (h + 1) % length
+        gone = ((self.alt[base + h], self.azi[base + h]), (self.alt[q], self.azi[q]))
+    else:
+      self.count[slot] += 1
+    self.alt[base + h] = alt
+    self.azi[base + h] = azi
+    self.head[slot] = (h + 1) % length
+    self.last[slot] = t
+    self.version += 1
+    self.log.append((self.version, self.prn[slot], prev, (alt, azi), gone))
+
+  def points(self, slot):
+    # (alt, azi) in radians, oldest first
+    length, base = self.length, slot * self.length
+    n = self.count[slot]
+    start = (self.head[slot] - n) % length
+    r = math.radians
+    return [(r(self.alt[base + (start + i) % length] / 100.0),
+      r(self.azi[base + (start + i) % length] / 100.0)) for i in range(n)]
+
+  def tracks(self):
+    '''{prn: points} for every track'''
+    with self.lock:
+      return dict((self.prn[s], self.points(s)) for s in range(self.maxSats) if self.prn[s])
+
+  def arrays(self):
+    '''{prn: (alt, azi)} NumPy arrays in radians, oldest first, for
+    skyProjection.project'''
+    length = self.length
+    with self.lock:
+      alt = np.frombuffer(self.alt, np.int16)
+      azi = np.frombuffer(self.azi, np.uint16)
+      out = {}
+      for s in range(self.maxSats):
+        if not self.prn[s]: continue
+        n = self.count[s]
+        i = s * length + (self.head[s] - n + np.arange(n)) % length
+        out[self.prn[s]] = (np.radians(alt[i] / 100.0), np.radians(azi[i] / 100.0))
+      return out
+
+  def since(self, version, wraps):
+    '''(version, wraps, segments, gone) since version: segments added and
+    segments dropped off the old end of full tracks; both are None if a
+    track was dropped or too much was added, redraw everything then;
+    a segment is (prn, from, to) in radians, from is None for a first point'''
+    with self.lock:
+      if wraps != self.wraps or (self.log and self.log[0][0] > version + 1):
+        return self.version, self.wraps, None, None
+      r = lambda p: p and (math.radians(p[0] / 100.0), math.radians(p[1] / 100.0))
+      log = [e for e in self.log if e[0] > version]
+      segs = [(prn, r(a), r(b)) for v, prn, a, b, g in log]
+      gone = [(prn, r(g[0]), r(g[1])) for v, prn, a, b, g in log if g]
+      return self.version, self.wraps, segs, gone
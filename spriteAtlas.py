@@ -0,0 +1,63 @@
+# pre-rendered satellite markers for the sky chart
+# each marker is the SNR circle with the PRN label centred in it, drawn
+# once onto a colour keyed surface and kept in a bounded LRU keyed by
+# (radius, colour, system, PRN, background), so a frame is only blits
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import pygame
+from collections import OrderedDict
+from fontCache import render
+from satTable import label
+
+KEY = (255,0,255) # transparent, not used by markers or labels
+
+class spriteAtlas():
+
+  def __init__(self, font, like, maxsize=512):
+    self.font = font # PRN labels
+    self.like = like # sprites are made in the pixel format of this surface
+    self.maxsize = maxsize
+    self.sprites = OrderedDict() # least recently used first
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, radius, color, sys, prn, bg):
+    '''(surface, (cx, cy)), blit the surface at x - cx, y - cy to centre it on x, y'''
+    key = (radius, color, sys, prn, bg)
+    sprites = self.sprites
+    sprite = sprites.pop(key, None)
+    if sprite is None:
+      self.misses += 1
+      sprite = self.make(radius, color, label(sys, prn), bg)
+      if len(sprites) >= self.maxsize:
+        sprites.popitem(last=False)
+    else:
+      self.hits += 1
+    sprites[key] = sprite # most recently used
+    return sprite
+
+  def make(self, radius, color, label, bg):
+    txt = render(self.font, label, (255,255,255), bg)
+    w, h = txt.get_size()
+    left, top = min(-radius, -(w // 2)), min(-radius, -(h // 2)) # relative to the centre
+    right, bottom = max(radius + 1, w - w // 2), max(radius + 1, h - h // 2)
+    surf = pygame.Surface((right - left, bottom - top), 0, self.like)
+    surf.fill(KEY)
+    surf.set_colorkey(KEY)
+    c = (-left, -top)
+    pygame.draw.circle(surf, color, c, radius, 1)
+    surf.blit(txt, (c[0] - w // 2, c[1] - h // 2))
+    return surf, c
+
+  def stats(self):
+    return {'size': len(self.sprites), 'hits': self.hits, 'misses': self.misses}
+
+def blits(surf, seq):
+  # Surface.blits where pygame has it (1.9.4 on), one blit at a time before
+  if hasattr(surf, 'blits'):
+    surf.blits(seq, False)
+  else:
+    for s, pos in seq:
+      surf.blit(s, pos)
@@ -0,0 +1,101 @@
+# star catalog held in NumPy arrays
+# alt/az and screen position for the whole catalog are computed in one
+# vectorized pass from the local sidereal time, instead of ephem.star
+# compute() for each star
+#
+# a catalog can come from:
+#   the Yale Bright Star Catalog, 5th ed. (bsc5.dat, ~9100 stars)
+#   a CSV file with ra,dec,mag in degrees (# comments allowed)
+#   the list of named ephem stars (default)
+#
+# positions are J2000; precession to the current date is under a pixel
+# on the sky chart so it is ignored, as is refraction
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math
+import numpy as np
+import ephem, ephem.stars
+from skyProjection import project
+
+def loadBSC5(filename, maxmag):
+  # Yale BSC5 fixed width ASCII, J2000 positions
+  ra, dec, mag = [], [], []
+  for line in open(filename):
+    try:
+      m = float(line[102:107])
+      h, mi, s = int(line[75:77]), int(line[77:79]), float(line[79:83])
+      d, dm, ds = int(line[84:86]), int(line[86:88]), int(line[88:90])
+    except ValueError: # novae and other entries without positions
+      continue
+    if m > maxmag: continue
+    de = d + dm/60.0 + ds/3600.0
+    if line[83] == '-': de = -de
+    ra.append((h + mi/60.0 + s/3600.0) * 15)
+    dec.append(de)
+    mag.append(m)
+  return ra, dec, mag
+
+def loadCSV(filename, maxmag):
+  # ra,dec,mag in degrees
+  ra, dec, mag = [], [], []
+  for line in open(filename):
+    line = line.split('#')[0].strip()
+    if not line: continue
+    try:
+      r, d, m = [float(v) for v in line.split(',')[:3]]
+    except ValueError: # header
+      continue
+    if m > maxmag: continue
+    ra.append(r)
+    dec.append(d)
+    mag.append(m)
+  return ra, dec, mag
+
+def loadEphem(names):
+  # astrometric J2000 positions of named ephem stars
+  ra, dec, mag = [], [], []
+  for name in names:
+    star = ephem.star(name)
+    star.compute('2000/1/1')
+    ra.append(math.degrees(star.a_ra))
+    dec.append(math.degrees(star.a_dec))
+    mag.append(star.mag)
+  return ra, dec, mag
+
+class starCatalog():
+
+  def __init__(self, filename=None, names=None, maxmag=6.5, ra=None, dec=None, mag=None):
+    if ra is None:
+      if filename is None:
+        ra, dec, mag = loadEphem(names)
+      elif filename.endswith('.dat'):
+        ra, dec, mag = loadBSC5(filename, maxmag)
+      else:
+        ra, dec, mag = loadCSV(filename, maxmag)
+    self.ra = np.radians(np.asarray(ra, dtype=np.float64))
+    dec = np.radians(np.asarray(dec, dtype=np.float64))
+    self.mag = np.asarray(mag, dtype=np.float64)
+    self.sindec = np.sin(dec) # constant per star
+    self.cosdec = np.cos(dec)
+
+  def __len__(self):
+    return len(self.ra)
+
+  def altaz(self, obs):
+    # alt, az in radians for every star, az from north through east
+    lat = float(obs.lat)
+    sinlat, coslat = math.sin(lat), math.cos(lat)
+    ha = float(obs.sidereal_time()) - self.ra # hour angle
+    cosha = np.cos(ha)
+    alt = np.arcsin(self.sindec * sinlat + self.cosdec * coslat * cosha)
+    az = np.arctan2(-np.sin(ha) * self.cosdec, self.sindec * coslat - self.cosdec * sinlat * cosha)
+    return alt, az
+
+  def project(self, obs):
+    '''screen x, y and magnitude of the stars above the horizon'''
+    alt, az = self.altaz(obs)
+    up = alt > 0
+    x, y = project(alt[up], az[up])
+    return x, y, self.mag[up]
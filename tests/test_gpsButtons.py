@@ -0,0 +1,100 @@
+# button debouncing and long presses, on the simulator with a test clock
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import time, unittest
+from gpsHub import gpsHub
+from gpsButtons import simButtons, sysfsButtons
+
+class clock():
+  def __init__(self):
+    self.t = 100.0
+  def __call__(self):
+    return self.t
+
+class testButtons(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = clock()
+    self.hub = gpsHub()
+    self.events = self.hub.subscribe('button', 64)
+    self.b = simButtons(debounce=0.03, longPress=1.0, clock=self.clock)
+    self.b.start(self.hub)
+
+  def at(self, t):
+    self.clock.t = 100.0 + t
+    return self.b.tick()
+
+  def got(self):
+    out = []
+    while len(self.events):
+      switch, kind, held = self.events.get(0)
+      out.append((switch, kind, round(held, 3)))
+    return out
+
+  def testPress(self):
+    self.b.press(2)
+    self.assertEqual(self.got(), [(2, 'press', 0)]) # at once, not after debounce
+    self.at(0.5)
+    self.b.release(2)
+    self.assertEqual(self.got(), [(2, 'release', 0.5)])
+
+  def testBounce(self):
+    # edges inside the debounce time are ignored, the pin is read again after it
+    self.b.press(1)
+    self.at(0.01); self.b.release(1)
+    self.at(0.02); self.b.press(1)
+    self.assertEqual(self.got(), [(1, 'press', 0)])
+    self.at(0.05)
+    self.assertEqual(self.got(), []) # settled down, nothing changed
+    self.b.release(1)
+    self.assertEqual(self.got(), [(1, 'release', 0.05)])
+
+  def testChangedWhileBouncing(self):
+    # a release during the lockout is picked up when it ends
+    self.b.press(3)
+    self.at(0.01); self.b.release(3)
+    self.assertAlmostEqual(self.at(0.02), 0.01) # seconds to the end of the lockout
+    self.at(0.03)
+    self.assertEqual(self.got(), [(3, 'press', 0), (3, 'release', 0.03)])
+
+  def testLongPress(self):
+    self.b.press(4)
+    self.at(0.03)
+    self.assertAlmostEqual(self.at(0.5), 0.5) # next deadline is the long press
+    self.at(1.0)
+    self.assertEqual(self.at(1.2), None) # nothing left to wait for
+    self.at(1.4); self.b.release(4)
+    self.assertEqual(self.got(), [(4, 'press', 0), (4, 'long', 1.0), (4, 'release', 1.4)])
+
+  def testShortPressNoLong(self):
+    self.b.press(1)
+    self.at(0.3); self.b.release(1)
+    self.at(2.0)
+    self.assertEqual([k for s, k, h in self.got()], ['press', 'release'])
+
+  def testSwitchesIndependent(self):
+    self.b.press(1)
+    self.b.press(2) # same instant, other switch isn't locked out
+    self.assertEqual(self.got(), [(1, 'press', 0), (2, 'press', 0)])
+    self.assertEqual(self.b.logic.events, 2)
+
+class noPins(sysfsButtons):
+  def pullUps(self):
+    pass
+
+class testSysfs(unittest.TestCase):
+
+  def testCloseWakes(self):
+    b = noPins(gpios=())
+    b.start(gpsHub())
+    thread = b.thread
+    time.sleep(0.05) # asleep with nothing due
+    t = time.time()
+    b.close()
+    self.assertFalse(thread.is_alive())
+    self.assertLess(time.time() - t, 0.5)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+# subscriptions, bounded queues and waiting on several at once
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import threading, time, unittest
+from gpsHub import gpsHub
+
+class testHub(unittest.TestCase):
+
+  def setUp(self):
+    self.hub = gpsHub()
+
+  def testFanOut(self):
+    a = self.hub.subscribe('fix')
+    b = self.hub.subscribe('fix')
+    self.hub.publish('fix', 1)
+    self.hub.publish('sky', 2) # nobody listening
+    self.assertEqual((a.get(0), b.get(0)), (1, 1))
+    self.assertEqual(a.get(0), None)
+
+  def testDropOldest(self):
+    a = self.hub.subscribe('fix', maxlen=3)
+    for i in range(5):
+      self.hub.publish('fix', i)
+    self.assertEqual((len(a), a.dropped), (3, 2))
+    self.assertEqual([a.get(0) for i in range(3)], [2, 3, 4])
+
+  def testWait(self):
+    a = self.hub.subscribe('a')
+    b = self.hub.subscribe('b')
+    self.assertEqual(self.hub.wait([a, b], 0), [])
+    t = time.time()
+    self.assertEqual(self.hub.wait([a, b], 0.05), [])
+    self.assertTrue(time.time() - t >= 0.05)
+    def later():
+      time.sleep(0.05)
+      self.hub.publish('b', 'x')
+    threading.Thread(target=later).start()
+    self.assertEqual(self.hub.wait([a, b], 5.0), [b])
+    self.assertEqual(b.get(0), 'x')
+    self.assertEqual(self.hub.wait([a, b], 0), []) # drained, no stale wakeup
+
+  def testGetWaits(self):
+    a = self.hub.subscribe('a')
+    threading.Timer(0.05, self.hub.publish, ('a', 7)).start()
+    self.assertEqual(a.get(5.0), 7)
+
+  def testClose(self):
+    a = self.hub.subscribe('a')
+    threading.Timer(0.05, a.close).start()
+    self.assertEqual(a.get(), None) # wakes up, no timeout needed
+    self.assertFalse(self.hub.wanted('a'))
+    self.assertEqual(list(a), [])
+
+  def testIterate(self):
+    a = self.hub.subscribe('a')
+    for i in range(3):
+      self.hub.publish('a', i)
+    threading.Timer(0.05, a.close).start()
+    self.assertEqual(list(a), [0, 1, 2])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,101 @@
+# several receivers on one poller: best and aggregate fixes, and which
+# read results drop a receiver
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, fcntl, math, time, unittest
+from pyGPS import pyGPS
+from gpsMux import gpsMux
+from pmtkConfig import pmtk
+
+def epoch(i, quality=1, hdop=1.0, lat='3726.3291', status='A'):
+  t = '1930{:02d}.000'.format(i)
+  return (pmtk('GPGGA,{},{},N,12207.4404,W,{},08,{},29.8,M,-25.6,M,,'.format(t, lat, quality, hdop)) +
+    pmtk('GPRMC,{},{},{},N,12207.4404,W,0.0,0.0,191114,,'.format(t, status, lat)))
+
+class pipePort():
+  # the read end of a pipe where the mux expects a serial port
+  def __init__(self):
+    self.rfd, self.wfd = os.pipe()
+    fcntl.fcntl(self.rfd, fcntl.F_SETFL, fcntl.fcntl(self.rfd, fcntl.F_GETFL) | os.O_NONBLOCK)
+    self.closed = False
+  def fileno(self):
+    return self.rfd
+  def close(self):
+    if not self.closed:
+      os.close(self.rfd)
+      self.closed = True
+
+class spurious():
+  # a poller that says fd is readable when it isn't
+  def __init__(self, fd, ev):
+    self.events = [(fd, ev)]
+  def poll(self, timeout):
+    return self.events
+  def unregister(self, fd):
+    pass
+
+class testMux(unittest.TestCase):
+
+  def setUp(self):
+    self.mux = gpsMux(maxAge=5.0)
+    self.ports = []
+
+  def tearDown(self):
+    for p in self.ports:
+      p.close()
+      if p.wfd is not None: os.close(p.wfd)
+
+  def receiver(self, data=None):
+    port = pipePort()
+    self.ports.append(port)
+    gps = pyGPS(port=port, avgWindow=1)
+    self.mux.attach(gps)
+    if data:
+      os.write(port.wfd, data)
+      self.mux.poll(0)
+    return gps
+
+  def testBest(self):
+    a = self.receiver(epoch(0, 1, 0.5))
+    b = self.receiver(epoch(0, 2, 1.2)) # DGPS beats a lower HDOP
+    c = self.receiver(epoch(0, 0, 0.4, status='V')) # no fix
+    self.assertEqual([g.fix.epoch for g in (a, b, c)], [1, 1, 1])
+    self.assertIs(self.mux.best(), b.fix)
+    b.published -= 10 # stale
+    self.assertIs(self.mux.best(), a.fix)
+
+  def testNoCurrent(self):
+    a = self.receiver(epoch(0, 0, status='V'))
+    self.assertIs(self.mux.best(), a.fix) # something to show
+    self.assertIs(self.mux.aggregate(), a.fix)
+
+  def testAggregate(self):
+    a = self.receiver(epoch(0, 1, 1.0, '3726.0000'))
+    b = self.receiver(epoch(0, 1, 2.0, '3727.0000'))
+    c = self.receiver(epoch(0, 0, 1.0, '3800.0000', 'V')) # left out
+    fix = self.mux.aggregate()
+    lat = (4 * 26.0 + 27.0) / 5 # weights 1/HDOP squared
+    self.assertAlmostEqual(math.degrees(fix.avg_latitude), 37 + lat / 60)
+    self.assertEqual(fix.hDilution, 1.0) # the rest from the best fix
+
+  def testEmptyReadKeeps(self):
+    gps = self.receiver()
+    port = self.ports[0]
+    self.mux.poller = spurious(port.rfd, self.mux.IN)
+    self.mux.poll(0) # EAGAIN
+    self.assertEqual(self.mux.devices, [gps])
+    self.assertFalse(port.closed)
+
+  def testEOF(self):
+    gps = self.receiver()
+    port = self.ports[0]
+    os.close(port.wfd)
+    port.wfd = None
+    self.mux.poll(0)
+    self.assertEqual(self.mux.devices, [])
+    self.assertTrue(port.closed)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,153 @@
+# power governor modes, frame pacing and backlight, with a test clock
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, shutil, tempfile, unittest
+from gpsPower import powerGovernor, findBacklight, gpioBacklight, pwmBacklight, turn
+
+class display():
+  def __init__(self):
+    self.levels = []
+  def backlight(self, level):
+    self.levels.append(level)
+
+class fix():
+  def __init__(self, speed, course=None):
+    self.speed = speed
+    self.course = course
+
+class testGovernor(unittest.TestCase):
+
+  def setUp(self):
+    self.t = 1000.0
+    self.display = display()
+    self.gov = powerGovernor(self.display, dimAfter=60, offAfter=300, activeFor=10,
+      stillAfter=30, clock=lambda: self.t)
+
+  def at(self, dt, fresh=False):
+    self.t = 1000.0 + dt
+    return self.gov.next(fresh)
+
+  def testIdle(self):
+    gov = self.gov
+    self.assertEqual(self.at(0), (True, 0)) # first frame at once
+    gov.frame()
+    self.assertEqual(gov.mode, 'active') # just started
+    self.at(11)
+    self.assertEqual(gov.mode, 'still')
+    gov.frame()
+    self.assertEqual(self.at(12, True), (False, 4.0)) # every 5 s when still
+    self.at(61)
+    self.assertEqual(gov.mode, 'dim')
+    self.assertEqual(self.display.levels[-1], 0.2)
+    self.at(300)
+    self.assertEqual(gov.mode, 'off')
+    self.assertEqual(self.display.levels[-1], 0.0)
+    self.assertEqual(self.at(400, True), (False, None)) # nothing until a button
+
+  def testWake(self):
+    self.at(0); self.gov.frame()
+    self.at(400)
+    self.assertEqual(self.gov.mode, 'off')
+    self.assertTrue(self.gov.input())
+    self.assertEqual(self.at(400, True), (True, 0))
+    self.assertEqual(self.gov.mode, 'active')
+    self.assertEqual(self.display.levels[-1], 1.0)
+
+  def testMoving(self):
+    gov = self.gov
+    self.at(20); gov.frame()
+    gov.fix(fix(10.0, 90.0))
+    self.assertEqual(self.at(20.1)[0], False)
+    self.assertEqual(gov.mode, 'moving')
+    self.assertEqual(self.at(20.5, True), (True, 0)) # 2 fps with new fixes
+    gov.frame()
+    self.assertEqual(self.at(21.0), (False, 0.5)) # 1 fps without
+    gov.fix(fix(10.0, 95.0)) # small turn, still steady
+    self.at(21.1)
+    self.assertEqual(gov.mode, 'moving')
+    gov.fix(fix(10.0, 130.0)) # turning
+    self.assertEqual(self.at(21.2, True), (True, 0))
+    self.assertEqual(gov.mode, 'active')
+    gov.frame()
+    draw, wait = self.at(21.25, True)
+    self.assertFalse(draw)
+    self.assertAlmostEqual(wait, 0.05) # every fix, up to 10 a second
+    self.at(60)
+    self.assertEqual(gov.mode, 'still') # 30 s after the last movement
+
+  def testSpeedChange(self):
+    gov = self.gov
+    self.at(20)
+    gov.fix(fix(0.2)); self.at(21)
+    self.assertEqual(gov.mode, 'still') # GPS wander isn't movement
+    gov.fix(fix(3.0)); self.at(22)
+    self.assertEqual(gov.mode, 'active')
+    self.assertEqual(gov.course, None)
+
+  def testMovingKeepsLit(self):
+    gov = self.gov
+    for t in range(0, 400, 10):
+      gov.fix(fix(10.0, 90.0), 1000.0 + t)
+      self.at(t)
+      self.assertNotEqual(gov.mode, 'dim')
+
+  def testRate(self):
+    gov = self.gov
+    for i in range(1000):
+      gov.frame(1000.0 + i * 0.1)
+    self.assertEqual(len(gov.times), 100) # only the last 10 s kept
+    self.assertEqual(gov.rate(1000.0 + 99.95), 10.0)
+    self.assertEqual(gov.rate(1200.0), 0.0)
+
+  def testTurn(self):
+    self.assertEqual(turn(350.0, 10.0), 20.0)
+    self.assertEqual(turn(10.0, 350.0), 20.0)
+    self.assertEqual(turn(90.0, 270.0), 180.0)
+
+class testBacklight(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(self.root, 'gpio', 'gpio252'))
+    for name in ('gpio/export', 'gpio/gpio252/direction', 'gpio/gpio252/value'):
+      open(os.path.join(self.root, name), 'w').close()
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def read(self, name):
+    with open(os.path.join(self.root, name)) as f:
+      return f.read()
+
+  def testGPIO(self):
+    light = findBacklight(252, self.root)
+    self.assertTrue(isinstance(light, gpioBacklight))
+    light.open()
+    self.assertEqual(self.read('gpio/gpio252/direction'), 'out')
+    light.set(0.2) # can't dim, stays on
+    self.assertEqual(self.read('gpio/gpio252/value'), '1')
+    fd = light.value.fd
+    light.set(0.0)
+    self.assertEqual(self.read('gpio/gpio252/value'), '0')
+    self.assertEqual(light.value.fd, fd) # same open file
+    light.close()
+
+  def testPWM(self):
+    path = os.path.join(self.root, 'backlight', 'soc:backlight')
+    os.makedirs(path)
+    with open(os.path.join(path, 'max_brightness'), 'w') as f:
+      f.write('100\n')
+    open(os.path.join(path, 'brightness'), 'w').close()
+    light = findBacklight(252, self.root)
+    self.assertTrue(isinstance(light, pwmBacklight))
+    light.open()
+    light.set(0.2)
+    self.assertEqual(self.read('backlight/soc:backlight/brightness'), '20')
+    light.set(2.0)
+    self.assertEqual(self.read('backlight/soc:backlight/brightness'), '100')
+    light.close()
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,45 @@
+# replay through a pty: close() waits for the receiver thread, which must
+# not be stuck in the source or on a full pty
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, time, unittest
+import serial
+from gpsSource import replaySource, ptyReceiver, mtkReceiver
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fixtures', 'sample.nmea')
+
+class testPty(unittest.TestCase):
+
+  def close(self, rcvr):
+    t = time.time()
+    rcvr.close()
+    self.assertFalse(rcvr.thread.is_alive())
+    self.assertLess(time.time() - t, 0.5)
+
+  def testReplay(self):
+    rcvr = ptyReceiver(replaySource(SAMPLE, rate=1))
+    rcvr.start()
+    port = serial.Serial(rcvr.device, timeout=2.0)
+    self.assertTrue(port.readline().startswith('$'))
+    port.close()
+    self.close(rcvr) # source is waiting for the next epoch
+
+  def testEndOfLog(self):
+    rcvr = ptyReceiver(replaySource(SAMPLE, rate=None, timeout=3.0))
+    rcvr.start()
+    port = serial.Serial(rcvr.device, timeout=0.2)
+    while port.read(4096): pass
+    port.close()
+    self.close(rcvr) # source would sleep its timeout
+
+  def testNobodyReading(self):
+    for cls in ptyReceiver, mtkReceiver:
+      rcvr = cls(replaySource(SAMPLE, rate=None, loop=True))
+      rcvr.start()
+      time.sleep(0.3) # pty full
+      self.close(rcvr)
+
+if __name__ == '__main__':
+  unittest.main()
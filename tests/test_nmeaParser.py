@@ -0,0 +1,119 @@
+# framing and checksums of nmeaParser.feed, with the data split into
+# chunks the way serial reads split it
+#
+#   python -m unittest discover tests      # from the top directory
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import unittest
+from nmeaParser import nmeaParser, checksum, checkBuffer, c2Float, c2Int, parseGGA
+from pmtkConfig import pmtk
+
+GGA = pmtk('GPGGA,193000.000,3726.3291,N,12207.4404,W,1,08,0.96,29.8,M,-25.6,M,,')
+RMC = pmtk('GPRMC,193000.000,A,3726.3291,N,12207.4404,W,0.1,54.7,191114,,')
+GSV = pmtk('GPGSV,3,1,11,02,15,305,10,05,66,091,21,06,45,161,24,12,57,283,11')
+
+def bad(line):
+  # same sentence, wrong checksum
+  s = line.rstrip('\r\n')
+  return s[:-2] + ('00' if s[-2:] != '00' else '01') + '\r\n'
+
+class testFraming(unittest.TestCase):
+
+  def testWhole(self):
+    p = nmeaParser()
+    out = p.feed(GGA + RMC)
+    self.assertEqual([a for a, f in out], ['GPGGA', 'GPRMC'])
+    self.assertEqual(out[0][1][0], '193000.000')
+    self.assertEqual(out[1][1][-2:], ['', '']) # trailing empty fields kept
+
+  def testChunks(self):
+    data = GGA + RMC + GSV
+    whole = nmeaParser().feed(data)
+    for size in (1, 2, 7, 13, 64):
+      p = nmeaParser()
+      out = []
+      for i in range(0, len(data), size):
+        out += p.feed(data[i:i+size])
+      self.assertEqual(out, whole, 'chunks of {}'.format(size))
+      self.assertEqual(p.buf, '')
+
+  def testNoise(self):
+    # garbage before the '$' and blank lines are skipped
+    p = nmeaParser()
+    out = p.feed('\x00\xff' + GGA + '\r\n' + 'junk' + RMC)
+    self.assertEqual([a for a, f in out], ['GPGGA', 'GPRMC'])
+
+  def testBadChecksum(self):
+    p = nmeaParser()
+    out = p.feed(GGA + bad(RMC) + GSV)
+    self.assertEqual([a for a, f in out], ['GPGGA', 'GPGSV'])
+    self.assertEqual(p.badsum, 1)
+    self.assertEqual(p.badsums, {'GPRMC': 1})
+
+  def testNoTrailer(self):
+    p = nmeaParser()
+    self.assertEqual(p.feed('$GPGGA,193000.000,,,,,0,00,,,M,,M,,\r\n'), [])
+    self.assertEqual(p.badsum, 1)
+
+  def testAccept(self):
+    p = nmeaParser(accept=set(['GPRMC']))
+    out = p.feed(GGA + RMC)
+    self.assertEqual([a for a, f in out], ['GPRMC'])
+    self.assertEqual(p.skipped, 1)
+    self.assertEqual(p.sentences, 2)
+
+  def testOverrun(self):
+    p = nmeaParser(maxline=100)
+    p.feed('$' + 'x' * 200)
+    self.assertEqual((p.buf, p.overruns), ('', 1))
+    self.assertEqual(len(p.feed('\r\n' + GGA)), 1)
+
+  def testTap(self):
+    p = nmeaParser(accept=set())
+    seen = []
+    p.tap = seen.append
+    p.feed(GGA + RMC)
+    self.assertEqual(seen, [GGA.rstrip(), RMC.rstrip()])
+
+class testChecksum(unittest.TestCase):
+
+  def testKnown(self):
+    # sentences from a receiver, not made with nmeaSum
+    for s in ('$GPGGA,193000.000,3726.3291,N,12207.4404,W,1,08,0.96,29.8,M,-25.6,M,,*66',
+        '$GPGSV,3,3,11,24,23,340,01,25,78,011,41,29,07,194,*45',
+        '$GPGSA,A,3,02,05,06,12,13,15,17,19,,,,,1.72,0.95,1.43*06'):
+      self.assertTrue(checksum(s, 0, s.rfind('*')), s)
+
+  def testLengths(self):
+    # short and long sentences take different paths through nmeaSum
+    for n in (0, 1, 7, 8, 9, 63, 64, 127, 128, 200):
+      s = pmtk('P' + 'A,' * n).rstrip()
+      self.assertTrue(checksum(s, 0, s.rfind('*')), n)
+      self.assertFalse(checksum(bad(s).rstrip(), 0, s.rfind('*')), n)
+
+  def testLowerCaseHex(self):
+    s = GGA.rstrip()
+    self.assertTrue(checksum(s[:-2] + s[-2:].lower(), 0, s.rfind('*')))
+
+  def testCheckBuffer(self):
+    out = checkBuffer(GGA + bad(RMC) + 'partial')
+    self.assertEqual([ok for line, ok in out], [True, False])
+    self.assertEqual(out[0][0], GGA.rstrip())
+
+class testFields(unittest.TestCase):
+
+  def testEmpty(self):
+    self.assertEqual((c2Float(''), c2Int('')), (0, 0))
+    self.assertEqual((c2Float('1.5'), c2Int('08')), (1.5, 8))
+    self.assertEqual((c2Float('x'), c2Int('1.5')), (0, 0))
+
+  def testGGA(self):
+    t, lat, lon, q, ns, hdop, alt, geo = parseGGA(nmeaParser().feed(GGA)[0][1])
+    self.assertEqual((t, q, ns, hdop, alt, geo), ('193000.000', 1, 8, 0.96, 29.8, -25.6))
+    self.assertAlmostEqual(lat, 37 + 26.3291 / 60)
+    self.assertAlmostEqual(lon, -(122 + 7.4404 / 60))
+
+if __name__ == '__main__':
+  unittest.main()
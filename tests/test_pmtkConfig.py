@@ -0,0 +1,47 @@
+# PMTK configuration against the simulated MTK receiver on a pty
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, unittest
+import serial
+from gpsSource import replaySource, mtkReceiver
+from pmtkConfig import pmtkConfig, pmtk
+
+SAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fixtures', 'sample.nmea')
+
+class testPMTK(unittest.TestCase):
+
+  def setUp(self):
+    self.rcvr = mtkReceiver(replaySource(SAMPLE, rate=20, loop=True), baud=9600)
+    self.rcvr.start()
+    self.port = serial.Serial(self.rcvr.device, baudrate=4800, timeout=0.1)
+    self.cfg = pmtkConfig(self.port, timeout=1.0)
+
+  def tearDown(self):
+    self.port.close()
+    self.rcvr.close()
+
+  def testSentence(self):
+    self.assertEqual(pmtk('PMTK220,100'), '$PMTK220,100*2F\r\n')
+
+  def testDetect(self):
+    self.assertEqual(self.cfg.detectBaud(timeout=1.0), 9600)
+    self.assertEqual(self.port.baudrate, 9600)
+
+  def testConfigure(self):
+    cfg = self.cfg
+    self.assertTrue(cfg.configure(115200, 10, gsv=5))
+    self.assertEqual((self.rcvr.baud, self.port.baudrate), (115200, 115200))
+    self.assertEqual(self.rcvr.interval, 100)
+    self.assertEqual(self.rcvr.mask, dict(gll=0, rmc=1, vtg=0, gga=1, gsa=0, gsv=5))
+    kinds = set(line[3:6] for line in cfg.lines(1.0) if line.startswith('$GP'))
+    self.assertEqual(kinds - set(['GGA', 'RMC', 'GSV']), set()) # the rest turned off
+
+  def testRejected(self):
+    self.cfg.detectBaud(timeout=1.0)
+    self.assertEqual(self.cfg.command('PMTK220,50'), 0) # 20 Hz is invalid
+    self.assertEqual(self.cfg.command('PMTK999'), 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,81 @@
+# position filters: averages, smoothing and the Kalman filter following
+# a moving fix
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import unittest, random
+from posFilter import runningMean, expSmooth, kalmanFilter, newFilter
+
+class testRunningMean(unittest.TestCase):
+
+  def testFilling(self):
+    f = runningMean(4)
+    self.assertEqual(f.update(1.0, 10.0), (1.0, 10.0))
+    self.assertEqual(f.update(3.0, 20.0), (2.0, 15.0)) # only real fixes averaged
+
+  def testWindow(self):
+    f = runningMean(4)
+    for v in range(10):
+      lat, lon = f.update(float(v), -float(v))
+    self.assertEqual((lat, lon), (7.5, -7.5)) # 6..9
+
+  def testNoDrift(self):
+    # running sums are redone each lap, so a long run matches a fresh sum
+    f = runningMean(10)
+    r = random.Random(1)
+    vals = [37.4 + r.random() * 1e-4 for i in range(100005)]
+    for v in vals:
+      lat, lon = f.update(v, v)
+    self.assertAlmostEqual(lat, sum(vals[-10:]) / 10, places=12)
+
+class testExpSmooth(unittest.TestCase):
+
+  def testStep(self):
+    f = expSmooth(0.5)
+    self.assertEqual(f.update(0.0, 0.0), (0.0, 0.0))
+    self.assertEqual(f.update(1.0, 2.0), (0.5, 1.0))
+    self.assertEqual(f.update(1.0, 2.0), (0.75, 1.5))
+
+class testKalman(unittest.TestCase):
+
+  def testStill(self):
+    # noise around a fixed point averages out
+    f = kalmanFilter()
+    r = random.Random(2)
+    for i in range(300):
+      lat, lon = f.update(37.0 + r.gauss(0, 3e-5), -122.0 + r.gauss(0, 3e-5), float(i), 1.0)
+    self.assertAlmostEqual(lat, 37.0, delta=2e-5)
+    self.assertAlmostEqual(lon, -122.0, delta=2e-5)
+
+  def testMoving(self):
+    # constant velocity is tracked without the lag of an average
+    f = kalmanFilter()
+    step = 1e-4 # degrees a second, about 11 m/s north
+    for i in range(120):
+      lat, lon = f.update(37.0 + i * step, -122.0, float(i), 1.0)
+    self.assertAlmostEqual(lat, 37.0 + 119 * step, delta=step / 2)
+    mean = runningMean(10)
+    for i in range(120):
+      mlat, mlon = mean.update(37.0 + i * step, -122.0)
+    self.assertTrue(abs(mlat - (37.0 + 119 * step)) > 4 * step) # 4.5 steps behind
+
+  def testMidnight(self):
+    f = kalmanFilter()
+    f.update(37.0, -122.0, 86399.0, 1.0)
+    f.update(37.0, -122.0, 0.0, 1.0) # time wraps, dt is 1 not -86399
+    self.assertEqual(f.t, 0.0)
+    lat, lon = f.update(37.0, -122.0, 1.0, 1.0)
+    self.assertAlmostEqual(lat, 37.0)
+
+class testNewFilter(unittest.TestCase):
+
+  def testNames(self):
+    self.assertTrue(isinstance(newFilter('mean', 5), runningMean))
+    self.assertTrue(isinstance(newFilter('exp', 9), expSmooth))
+    self.assertEqual(newFilter('exp', 9).alpha, 0.2)
+    self.assertTrue(isinstance(newFilter('kalman'), kalmanFilter))
+    self.assertRaises(ValueError, newFilter, 'median')
+
+if __name__ == '__main__':
+  unittest.main()
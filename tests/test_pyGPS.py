@@ -0,0 +1,110 @@
+# epochs from pyGPS.feed: GGA + RMC make an epoch, a GSV cycle in
+# progress holds it back, and a lost end of cycle doesn't freeze it;
+# GSV from several systems in one view, GLL in place of RMC
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math, unittest
+from pyGPS import pyGPS
+from pmtkConfig import pmtk
+
+def epoch(i, quality=1, status='A'):
+  t = '1930{:02d}.000'.format(i)
+  return (pmtk('GPGGA,{},3726.3291,N,12207.4404,W,{},08,0.96,29.8,M,-25.6,M,,'.format(t, quality)) +
+    pmtk('GPRMC,{},{},3726.3291,N,12207.4404,W,12.5,054.7,191114,,'.format(t, status)))
+
+GSV1 = pmtk('GPGSV,2,1,05,02,15,305,10,05,66,091,21,06,45,161,24,12,57,283,11')
+GSV2 = pmtk('GPGSV,2,2,05,13,12,010,11')
+
+class port():
+  pass
+
+class testEpochs(unittest.TestCase):
+
+  def setUp(self):
+    self.gps = pyGPS(port=port())
+    self.fixes = self.gps.fixes()
+
+  def testEpoch(self):
+    gps = self.gps
+    gps.feed(epoch(0))
+    fix = self.fixes.get(0)
+    self.assertEqual((fix.epoch, fix.status, fix.quality, fix.nsats), (1, 'A', 1, 8))
+    self.assertEqual((fix.speed, fix.course), (12.5, 54.7))
+    self.assertAlmostEqual(math.degrees(fix.latitude), 37 + 26.3291 / 60)
+    self.assertEqual(fix.utc % 86400, 19 * 3600 + 30 * 60)
+
+  def split(self, i):
+    # GGA, then a GSV cycle starts, then RMC, as an MTK receiver sends them
+    gga, rmc = epoch(i).split('\n', 1)
+    self.gps.feed(gga + '\n' + GSV1 + rmc)
+
+  def testHeldForGSV(self):
+    gps = self.gps
+    self.split(0)
+    self.assertEqual(gps.fix.epoch, 0) # waiting for the rest of the cycle
+    gps.feed(GSV2)
+    self.assertEqual(gps.fix.epoch, 1)
+    self.assertEqual(len(gps.fix.satellites), 5)
+
+  def testLostGSV(self):
+    gps = self.gps
+    self.split(0)
+    s = GSV2.rstrip()
+    gps.feed(s[:-2] + '00\r\n') # end of the cycle garbled
+    epochs = []
+    for i in range(1, 5):
+      gps.feed(epoch(i))
+      epochs.append(gps.fix.epoch)
+    self.assertEqual(epochs, [2, 3, 4, 5]) # held epoch out, then one each
+
+  def testFixLost(self):
+    gps = self.gps
+    gps.feed(epoch(0))
+    gps.feed(epoch(1, 0, 'V'))
+    fix = gps.fix
+    self.assertEqual((fix.quality, fix.statusOK), (0, False))
+    self.assertEqual(fix.hDilution, 0.96) # last known, with quality 0
+
+GLSV = pmtk('GLGSV,1,1,02,65,30,100,20,72,40,200,25')
+GNSV = pmtk('GNGSV,1,1,02,66,10,050,15,80,20,250,18') # GLONASS under GN
+
+def gll(i, status='A'):
+  return pmtk('GNGLL,3726.3291,N,12207.4404,W,1930{:02d}.000,{},A'.format(i, status))
+
+class testConstellations(unittest.TestCase):
+
+  def setUp(self):
+    self.gps = pyGPS(port=port())
+
+  def testMerged(self):
+    gps = self.gps
+    gps.feed(GSV1 + GSV2 + GLSV)
+    sats = dict((s.svn, s.sys) for s in gps.satellites)
+    self.assertEqual(len(sats), 7) # GPS cycle kept when GLONASS finishes
+    self.assertEqual((sats['02'], sats['R01'], sats['R08']), (0, 1, 1))
+    gps.feed(GNSV)
+    labels = sorted(s.svn for s in gps.satellites if s.sys == 1)
+    self.assertEqual(labels, ['R02', 'R16']) # the newer GLONASS cycle
+
+  def testGLLEpoch(self):
+    gps = self.gps
+    for i in range(3):
+      gga = epoch(i).split('\n', 1)[0] + '\n'
+      gps.feed(gga + gll(i))
+    fix = gps.fix
+    self.assertEqual((fix.epoch, fix.status, fix.statusOK), (3, 'A', True))
+    self.assertAlmostEqual(math.degrees(fix.latitude), 37 + 26.3291 / 60)
+
+  def testGLLWithRMC(self):
+    gps = self.gps
+    gps.feed(epoch(0).split('\n', 1)[0] + '\n' + gll(0)) # before the first RMC
+    gps.feed(epoch(0).split('\n', 1)[1])
+    self.assertEqual(gps.fix.epoch, 1) # not twice
+    gps.feed(epoch(1) + gll(1, 'V'))
+    fix = gps.fix
+    self.assertEqual((fix.epoch, fix.status), (2, 'A')) # RMC's, GLL ignored now
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,71 @@
+# satellite table: GSV cycles written in place, published as a satView
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math, unittest
+from satTable import satTable, satView, label, MAXPRN, STALE
+
+def sats(*prns):
+  return [('{:02d}'.format(p), math.radians(p % 90), math.radians(p * 3 % 360), p % 50) for p in prns]
+
+class testSatTable(unittest.TestCase):
+
+  def cycle(self, table, n, sys, prns):
+    table.begin(sys)
+    table.updateAll(sats(*prns), n, sys)
+    return table.finish(n, sys)
+
+  def testView(self):
+    t = satTable()
+    view = self.cycle(t, 1, 0, [2, 5, 12])
+    self.assertEqual(list(view.prn), [2, 5, 12])
+    self.assertEqual(view.keys(), [2, 5, 12])
+    self.assertAlmostEqual(view.alt[1], math.radians(5), 6)
+    self.assertEqual(list(view.snr), [2, 5, 12])
+    s = list(view)[2]
+    self.assertEqual((s.svn, s.sys, s.snr), ('12', 0, 12))
+    self.assertIs(list(view)[0], list(view)[0]) # objects built once
+
+  def testInPlace(self):
+    t = satTable()
+    self.cycle(t, 1, 0, [2, 5])
+    alt = t.alt
+    view = self.cycle(t, 2, 0, [5, 7]) # 2 set, 7 rose
+    self.assertIs(t.alt, alt)
+    self.assertEqual(list(view.prn), [5, 7])
+
+  def testSystems(self):
+    t = satTable()
+    self.cycle(t, 1, 0, [2, 5])
+    view = self.cycle(t, 2, 1, [65, 72])
+    self.assertEqual(list(view.sys), [0, 0, 1, 1])
+    self.assertEqual(view.keys(), [2, 5, MAXPRN + 65, MAXPRN + 72])
+    self.assertEqual([s.svn for s in view], ['02', '05', 'R01', 'R08'])
+
+  def testUnfinished(self):
+    t = satTable()
+    self.cycle(t, 1, 0, [2, 5])
+    t.begin(0)
+    t.updateAll(sats(9), 2, 0) # cycle never finished
+    view = self.cycle(t, 3, 1, [65])
+    self.assertEqual(list(view.prn), [2, 5, 65]) # last complete GPS cycle
+
+  def testStale(self):
+    t = satTable()
+    self.cycle(t, 1, 0, [2])
+    for n in range(STALE + 1):
+      view = self.cycle(t, n + 2, 1, [65])
+    self.assertEqual(list(view.sys), [1]) # GPS went quiet
+
+  def testIgnoresBadPRN(self):
+    t = satTable()
+    view = self.cycle(t, 1, 0, [0, 3, MAXPRN])
+    self.assertEqual(list(view.prn), [3])
+
+  def testLabel(self):
+    self.assertEqual([label(0, 7), label(1, 65), label(1, 3), label(2, 11)], ['07', 'R01', 'R03', 'E11'])
+    self.assertEqual(len(satView()), 0)
+
+if __name__ == '__main__':
+  unittest.main()
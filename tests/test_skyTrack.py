@@ -0,0 +1,53 @@
+# sky tracks: full rings drop their oldest segment without a full redraw
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import math, unittest
+from skyTrack import skyTrack
+
+class view():
+  # the parts of satView skyTrack reads
+  def __init__(self, sats):
+    self.sats = sats # [(key, alt, azi)] in degrees
+    self.alt = [math.radians(s[1]) for s in sats]
+    self.azi = [math.radians(s[2]) for s in sats]
+  def keys(self):
+    return [s[0] for s in self.sats]
+
+class testSkyTrack(unittest.TestCase):
+
+  def testFullRingLogsGone(self):
+    t = skyTrack(interval=60, length=3, maxSats=4)
+    for i in range(3):
+      t.add(view([(5, 10 + i, 100)]), i * 60)
+    version, wraps, segs, gone = t.since(0, 0)
+    self.assertEqual(len(segs), 3)
+    self.assertEqual(gone, [])
+    t.add(view([(5, 13, 100)]), 180)
+    v2, w2, segs, gone = t.since(version, wraps)
+    self.assertEqual(w2, wraps) # not a wrap, nothing to rebuild
+    self.assertEqual(len(segs), 1)
+    prn, a, b = gone[0]
+    self.assertEqual(prn, 5)
+    self.assertAlmostEqual(math.degrees(a[0]), 10)
+    self.assertAlmostEqual(math.degrees(b[0]), 11)
+    alt, azi = t.arrays()[5]
+    self.assertEqual([round(math.degrees(x)) for x in alt], [11, 12, 13])
+
+  def testReuseIsWrap(self):
+    t = skyTrack(interval=60, length=3, maxSats=1)
+    t.add(view([(5, 10, 100)]), 0)
+    version, wraps = t.version, t.wraps
+    t.add(view([(6, 20, 200)]), 60)
+    self.assertEqual(t.since(version, wraps)[2:], (None, None))
+    self.assertEqual(t.arrays().keys(), [6])
+
+  def testInterval(self):
+    t = skyTrack(interval=60, length=3, maxSats=1)
+    t.add(view([(5, 10, 100)]), 0)
+    t.add(view([(5, 11, 100)]), 30)
+    self.assertEqual(len(t.tracks()[5]), 1)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,116 @@
+# track log round trip, time seek through the index and crash recovery
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, math, shutil, tempfile, unittest
+from trackLog import trackLog, trackReader, RECORD, INDEX
+
+T0 = 1400000000.0
+
+def fill(log, n, start=0):
+  for i in range(start, start + n):
+    log.add(T0 + i, 37.0 + i * 1e-5, -122.0, 10.0 + i, 1.5 if i % 2 else None, 90.0, 0.9, 1, 8)
+
+class testTrackLog(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.name = os.path.join(self.dir, 'track.bin')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def testRoundTrip(self):
+    log = trackLog(self.name, indexEvery=8, flushEvery=5)
+    fill(log, 20)
+    log.close()
+    self.assertEqual(os.path.getsize(self.name), 20 * RECORD.size)
+    self.assertEqual(os.path.getsize(self.name + '.idx'), 3 * INDEX.size)
+    r = trackReader(self.name)
+    self.assertEqual(len(r), 20)
+    t, lat, lon, alt, spd, crs, hdop, q, ns = r.record(3)
+    self.assertEqual((t, lon, alt, spd, crs, q, ns), (T0 + 3, -122.0, 13.0, 1.5, 90.0, 1, 8))
+    self.assertAlmostEqual(lat, 37.00003)
+    self.assertTrue(r.record(2)[4] != r.record(2)[4]) # unknown speed is NaN
+
+  def testSeek(self):
+    log = trackLog(self.name, indexEvery=8)
+    fill(log, 100)
+    log.close()
+    r = trackReader(self.name)
+    for t in (T0 - 5, T0, T0 + 7, T0 + 8, T0 + 8.5, T0 + 63, T0 + 99):
+      want = max(0, int(t - T0 + 0.999))
+      self.assertEqual(r.seek(t), want, t)
+    self.assertEqual(r.seek(T0 + 200), 100)
+    times = [rec[0] for rec in r.records(T0 + 10, T0 + 15)]
+    self.assertEqual(times, [T0 + i for i in range(10, 15)])
+
+  def testInOrder(self):
+    log = trackLog(self.name)
+    self.assertTrue(log.add(T0, 0, 0, 0, None, None, 1, 1, 4))
+    self.assertFalse(log.add(T0, 0, 0, 0, None, None, 1, 1, 4))
+    self.assertFalse(log.add(T0 - 1, 0, 0, 0, None, None, 1, 1, 4))
+    log.close()
+    log = trackLog(self.name) # the last time survives a reopen
+    self.assertFalse(log.add(T0, 0, 0, 0, None, None, 1, 1, 4))
+    log.close()
+
+  def testPartialRecord(self):
+    # a crash part way through a write, then more records appended
+    log = trackLog(self.name, indexEvery=8)
+    fill(log, 10)
+    log.close()
+    with open(self.name, 'ab') as f:
+      f.write('x' * 20)
+    log = trackLog(self.name, indexEvery=8)
+    self.assertEqual(log.count, 10)
+    fill(log, 10, 10)
+    log.close()
+    r = trackReader(self.name)
+    self.assertEqual([rec[0] for rec in r.records()], [T0 + i for i in range(20)])
+    self.assertEqual(r.record(15)[3], 25.0)
+
+  def testIndexRepair(self):
+    log = trackLog(self.name, indexEvery=8)
+    fill(log, 30)
+    log.close()
+    with open(self.name + '.idx', 'r+b') as f:
+      f.truncate(INDEX.size + 5) # lost the end of the index
+    trackLog(self.name, indexEvery=8).close()
+    self.assertEqual(os.path.getsize(self.name + '.idx'), 4 * INDEX.size)
+    self.assertEqual(trackReader(self.name).seek(T0 + 20), 20)
+
+  def testEmpty(self):
+    trackLog(self.name).close()
+    r = trackReader(self.name)
+    self.assertEqual((len(r), r.seek(T0), list(r.records())), (0, 0, []))
+
+class fix():
+  def __init__(self, **kw):
+    self.__dict__.update(dict(utc=T0, statusOK=True, quality=1, latitude=0.6, longitude=-2.1,
+      avg_latitude=0.7, avg_longitude=-2.2, altitude=5.0, speed=None, course=None,
+      hDilution=1.0, nsats=6), **kw)
+
+class testAddFix(unittest.TestCase):
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.name = os.path.join(self.dir, 'track.bin')
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def testFix(self):
+    log = trackLog(self.name)
+    self.assertTrue(log.addFix(fix()))
+    self.assertFalse(log.addFix(fix(utc=T0 + 1, quality=0))) # fix lost
+    self.assertFalse(log.addFix(fix(utc=T0 + 2, statusOK=False)))
+    self.assertFalse(log.addFix(fix(utc=None)))
+    log.close()
+    r = trackReader(self.name)
+    self.assertEqual(len(r), 1)
+    self.assertAlmostEqual(r.record(0)[1], math.degrees(0.6)) # the fix, not the average
+
+if __name__ == '__main__':
+  unittest.main()
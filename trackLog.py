@@ -0,0 +1,248 @@
+#!/usr/bin/python
+
+# compact binary track log
+# fixed size records appended to a data file in time order, written in
+# batches so the SD card sees a few large writes instead of a line per fix
+# a sidecar index (name.idx) holds the time of every Nth record; readers
+# memory map both files and find a time with a binary search of the index
+# and a short scan of the data
+#
+#   log = trackLog('/home/pi/track.bin')
+#   trackLogger(gps, log).start()       # log every fix from a pyGPS
+#
+#   python trackLog.py track.bin --gpx out.gpx --start 2014-06-01T10:00
+#   python trackLog.py track.bin --csv out.csv
+#
+# Copyright (c) 2014 William B Phelps
+#
+
+import os, sys, time, math, mmap, struct, threading, calendar
+import argparse
+from bisect import bisect_left
+from datetime import datetime
+
+# time (s UTC), lat, lon (deg), alt (m), speed (knots), course (deg), hdop, quality, nsats
+RECORD = struct.Struct('<dddffffBBxx')
+INDEX = struct.Struct('<dQ') # time, record number
+NaN = float('nan') # speed/course not known
+
+class trackLog():
+
+  def __init__(self, filename, indexEvery=64, flushEvery=60, flushInterval=30.0):
+    self.filename = filename
+    self.indexEvery = indexEvery # records per index entry
+    self.flushEvery = flushEvery # records held before writing
+    self.flushInterval = flushInterval # or seconds
+    self.data = open(filename, 'ab')
+    self.index = open(filename + '.idx', 'ab')
+    self.buf = bytearray()
+    self.ibuf = bytearray()
+    size = os.path.getsize(filename)
+    self.count = size // RECORD.size # records on disk
+    if size != self.count * RECORD.size: # part of a record from a crash
+      self.data.truncate(self.count * RECORD.size)
+    self.pending = 0
+    self.last = self.lastTime() # records must go forward in time
+    self.flushed = time.time()
+    self.lock = threading.Lock()
+    self.repair()
+
+  def lastTime(self):
+    if not self.count: return None
+    with open(self.filename, 'rb') as f:
+      f.seek((self.count - 1) * RECORD.size)
+      return RECORD.unpack(f.read(RECORD.size))[0]
+
+  def repair(self):
+    # index entries lost when we were stopped between data and index writes
+    size = os.path.getsize(self.filename + '.idx')
+    n = size // INDEX.size
+    want = (self.count + self.indexEvery - 1) // self.indexEvery
+    if n > want or size != n * INDEX.size: # entries past the data, or part of one
+      n = min(n, want)
+      self.index.truncate(n * INDEX.size)
+    if n >= want: return
+    with open(self.filename, 'rb') as f:
+      for i in range(n, want):
+        f.seek(i * self.indexEvery * RECORD.size)
+        t = RECORD.unpack(f.read(RECORD.size))[0]
+        self.index.write(INDEX.pack(t, i * self.indexEvery))
+    self.index.flush()
+
+  def add(self, t, lat, lon, alt, speed, course, hdop, quality, nsats):
+    '''append a record, t in seconds UTC; older times are ignored'''
+    with self.lock:
+      if self.last is not None and t <= self.last: return False
+      self.last = t
+      n = self.count + self.pending
+      if n % self.indexEvery == 0:
+        self.ibuf += INDEX.pack(t, n)
+      self.buf += RECORD.pack(t, lat, lon, alt, NaN if speed is None else speed,
+        NaN if course is None else course, hdop, quality, min(nsats, 255))
+      self.pending += 1
+      if self.pending >= self.flushEvery or time.time() - self.flushed >= self.flushInterval:
+        self._flush()
+      return True
+
+  def addFix(self, fix):
+    # log a gpsFix if it has a position and a time
+    if fix.statusOK and fix.quality > 0 and fix.utc is not None:
+      return self.add(fix.utc, math.degrees(fix.latitude), math.degrees(fix.longitude),
+        fix.altitude, fix.speed, fix.course, fix.hDilution, fix.quality, fix.nsats or 0)
+    return False
+
+  def flush(self):
+    with self.lock:
+      self._flush()
+
+  def _flush(self):
+    # data first, so an index entry never points past the end of the data
+    if self.buf:
+      self.data.write(self.buf)
+      self.data.flush()
+      self.buf = bytearray()
+      self.count += self.pending
+      self.pending = 0
+    if self.ibuf:
+      self.index.write(self.ibuf)
+      self.index.flush()
+      self.ibuf = bytearray()
+    self.flushed = time.time()
+
+  def close(self):
+    self.flush()
+    self.data.close()
+    self.index.close()
+
+class trackLogger():
+  # logs each new epoch of a pyGPS from its own subscription
+
+  def __init__(self, gps, log):
+    self.gps = gps
+    self.log = log
+    self._run = False
+
+  def run(self):
+    sub, log = self.sub, self.log
+    while self._run:
+      wait = None # nothing held, sleep until a fix
+      if log.pending: # don't sit on what we have if fixes stop
+        wait = max(log.flushed + log.flushInterval - time.time(), 0)
+      fix = sub.get(wait)
+      if fix is not None:
+        log.addFix(fix)
+      elif log.pending and time.time() - log.flushed >= log.flushInterval:
+        log.flush()
+    log.flush()
+
+  def start(self):
+    self.sub = self.gps.fixes(maxlen=64) # before the thread, so no fix is missed
+    self._run = True
+    self.thread = threading.Thread(target = self.run)
+    self.thread.daemon = True
+    self.thread.start()
+
+  def stop(self):
+    self._run = False
+    self.sub.close() # wakes run()
+
+class indexTimes():
+  # the times in a mapped index, as a sequence for bisect
+  def __init__(self, mm):
+    self.mm = mm
+  def __len__(self):
+    return len(self.mm) // INDEX.size
+  def __getitem__(self, i):
+    return INDEX.unpack_from(self.mm, i * INDEX.size)[0]
+
+def mapFile(filename):
+  # read only map, None for an empty file (mmap can't map those)
+  with open(filename, 'rb') as f:
+    if os.fstat(f.fileno()).st_size == 0: return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class trackReader():
+
+  def __init__(self, filename):
+    self.data = mapFile(filename)
+    self.index = mapFile(filename + '.idx')
+    self.count = len(self.data) // RECORD.size if self.data else 0
+    self.every = INDEX.unpack_from(self.index, INDEX.size)[1] if (
+      self.index and len(self.index) >= 2 * INDEX.size) else max(self.count, 1)
+
+  def __len__(self):
+    return self.count
+
+  def record(self, i):
+    return RECORD.unpack_from(self.data, i * RECORD.size)
+
+  def seek(self, t):
+    '''number of the first record at or after t'''
+    if not self.count: return 0
+    if self.index:
+      times = indexTimes(self.index)
+      k = bisect_left(times, t)
+      i = max(k - 1, 0) * self.every # start of the block t falls in
+    else:
+      i = 0
+    while i < self.count and self.record(i)[0] < t:
+      i += 1
+    return i
+
+  def records(self, start=None, end=None):
+    '''records with start <= time < end, one at a time'''
+    i = self.seek(start) if start is not None else 0
+    while i < self.count:
+      r = self.record(i)
+      if end is not None and r[0] >= end: return
+      yield r
+      i += 1
+
+def isoTime(t):
+  return datetime.utcfromtimestamp(t).strftime('%Y-%m-%dT%H:%M:%S') + ('%.3fZ' % (t % 1))[1:]
+
+def exportCSV(reader, out, start=None, end=None):
+  out.write('time,lat,lon,alt,speed,course,hdop,quality,nsats\n')
+  for t, lat, lon, alt, spd, crs, hdop, q, ns in reader.records(start, end):
+    out.write('{},{:.7f},{:.7f},{:.1f},{},{},{:.2f},{},{}\n'.format(isoTime(t), lat, lon, alt,
+      '' if spd != spd else '{:.2f}'.format(spd), '' if crs != crs else '{:.1f}'.format(crs), hdop, q, ns))
+
+def exportGPX(reader, out, start=None, end=None):
+  out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<gpx version="1.1" creator="PiTFT-GPS" xmlns="http://www.topografix.com/GPX/1/1">\n'
+    '<trk><trkseg>\n')
+  for t, lat, lon, alt, spd, crs, hdop, q, ns in reader.records(start, end):
+    out.write('<trkpt lat="{:.7f}" lon="{:.7f}"><ele>{:.1f}</ele><time>{}</time>'
+      '<sat>{}</sat><hdop>{:.2f}</hdop></trkpt>\n'.format(lat, lon, alt, isoTime(t), ns, hdop))
+  out.write('</trkseg></trk>\n</gpx>\n')
+
+def parseTime(s):
+  # ISO date/time, UTC, to seconds
+  for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+    try:
+      return calendar.timegm(datetime.strptime(s, fmt).timetuple())
+    except ValueError:
+      pass
+  raise argparse.ArgumentTypeError('bad time {}'.format(s))
+
+def main():
+  ap = argparse.ArgumentParser(description='export a binary track log')
+  ap.add_argument('log')
+  ap.add_argument('--gpx', help='write GPX to this file (- for stdout)')
+  ap.add_argument('--csv', help='write CSV to this file (- for stdout)')
+  ap.add_argument('--start', type=parseTime, help='UTC, e.g. 2014-06-01T10:00')
+  ap.add_argument('--end', type=parseTime)
+  args = ap.parse_args()
+  reader = trackReader(args.log)
+  for name, fn in ((args.gpx, exportGPX), (args.csv, exportCSV)):
+    if name is None: continue
+    out = sys.stdout if name == '-' else open(name, 'w')
+    fn(reader, out, args.start, args.end)
+    if out is not sys.stdout: out.close()
+  if not (args.gpx or args.csv):
+    print '{} records'.format(len(reader))
+    if len(reader):
+      print '{} to {}'.format(isoTime(reader.record(0)[0]), isoTime(reader.record(len(reader) - 1)[0]))
+
+if __name__ == '__main__':
+  main()